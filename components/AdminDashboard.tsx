@@ -61,7 +61,7 @@ const AdminDashboard: React.FC = () => {
         setCallsLoading(true);
         setUserCalls([]); // Reset calls
         try {
-            const response = await fetch(`http://localhost:8000/calls?user_id=${userId}`);
+            const response = await fetch(`http://localhost:8000/calls?user_id=${userId}&fields=summary`);
             if (!response.ok) {
                 console.warn(`Failed to fetch calls: ${response.status} ${response.statusText}`);
                 // If 404, it might mean the endpoint isn't ready or user has no calls (depending on backend impl)
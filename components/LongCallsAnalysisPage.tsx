@@ -40,6 +40,9 @@ interface AnalysisResult {
             type: string;
             risk: string;
             text?: string;
+            segment_index?: number;
+            speaker?: string;
+            timestamp?: number;
         }>;
         scoring: {
             final_score: number;
@@ -0,0 +1,47 @@
+from collections import defaultdict
+from typing import List, Dict, Any
+
+
+def assign_speakers(segments: List[Dict[str, Any]], turns: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Sets each transcript segment's "speaker" to the diarization speaker with the largest
+    total temporal overlap. Segments that overlap no turn keep their current speaker.
+
+    Both lists are swept once in start-time order (two pointers), so the cost is
+    O(n + m) for sorted input plus the number of overlapping turn/segment pairs,
+    instead of O(n * m) for scanning every turn per segment.
+    Segments are updated in place and returned.
+    """
+    if not segments or not turns:
+        return segments
+
+    ordered_turns = sorted(turns, key=lambda t: (t["start"], t["end"]))
+    ordered_segments = sorted(segments, key=lambda s: (s["start"], s["end"]))
+
+    first = 0  # first turn that can still overlap the current or a later segment
+    for segment in ordered_segments:
+        seg_start, seg_end = segment["start"], segment["end"]
+        # Zero-length segments are treated as a point: the turn containing it wins
+        is_point = seg_end <= seg_start
+
+        # Turns that end before this segment starts cannot overlap any later segment either
+        while first < len(ordered_turns) and ordered_turns[first]["end"] < seg_start:
+            first += 1
+
+        overlap_by_speaker = defaultdict(float)
+        j = first
+        while j < len(ordered_turns) and ordered_turns[j]["start"] <= seg_end:
+            turn = ordered_turns[j]
+            if is_point:
+                if turn["start"] <= seg_start <= turn["end"]:
+                    overlap_by_speaker[turn["speaker"]] += 1.0
+            else:
+                overlap = min(seg_end, turn["end"]) - max(seg_start, turn["start"])
+                if overlap > 0:
+                    overlap_by_speaker[turn["speaker"]] += overlap
+            j += 1
+
+        if overlap_by_speaker:
+            segment["speaker"] = max(overlap_by_speaker.items(), key=lambda item: item[1])[0]
+
+    return segments
@@ -0,0 +1,202 @@
+import glob
+import json
+import os
+import re
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+import numpy as np
+import config
+from call_metrics import summarize_call
+from file_store import atomic_write
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+# File name of an exported part: part-<first seq>-<last seq>.<format>
+PART_NAME = re.compile(r"^part-\d+-(\d+)\.(\w+)$")
+
+
+def _datetime64(timestamp) -> np.datetime64:
+    try:
+        return np.datetime64(datetime.fromisoformat(str(timestamp)), "ms")
+    except (TypeError, ValueError):
+        return np.datetime64("NaT", "ms")
+
+
+def _float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class AnalyticsExporter:
+    """
+    Exports scored calls into columnar files for offline analysis: one `calls` table with a
+    row per call and one `steps` table with a row per SOP step result. Only the compact
+    call records are read, never the transcripts.
+    Each run appends a new part file per table containing only calls saved since the previous run
+    in the same format; npz and parquet exports keep separate watermarks.
+    """
+
+    FORMATS = ("npz", "parquet")
+
+    def __init__(self, db_service, export_dir: Optional[str] = None):
+        self.db_service = db_service
+        self.export_dir = export_dir or config.EXPORT_DIR
+        self.state_path = os.path.join(self.export_dir, "export_state.json")
+        os.makedirs(self.export_dir, exist_ok=True)
+
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return {"last_seq": {}}
+
+    def _save_state(self, state: Dict[str, Any]):
+        with atomic_write(self.state_path) as f:
+            json.dump(state, f, indent=2)
+
+    def _watermark(self, state: Dict[str, Any], fmt: str) -> int:
+        """Seq of the last call exported in fmt."""
+        marks = state.get("last_seq")
+        if isinstance(marks, dict) and fmt in marks:
+            return marks[fmt]
+        # First export in this format, or a state file from before per-format watermarks:
+        # resume after the newest part file of this format; files not named by export() are ignored
+        last_seqs = []
+        for path in glob.glob(os.path.join(self.export_dir, "calls", f"part-*.{fmt}")):
+            match = PART_NAME.match(os.path.basename(path))
+            if match and match.group(2) == fmt:
+                last_seqs.append(int(match.group(1)))
+        return max(last_seqs, default=0)
+
+    @staticmethod
+    def build_rows(seq: int, call: Dict[str, Any]):
+        """Flatten one stored call into its `calls` row and `steps` rows."""
+        evaluation = call.get("evaluation", {}) or {}
+        scoring = evaluation.get("scoring", {}) or {}
+        metadata = call.get("metadata") or {}
+        summary = summarize_call(call)
+        timestamp = _datetime64(call.get("timestamp"))
+
+        call_row = {
+            "seq": seq,
+            "call_id": call.get("call_id") or "",
+            "region": metadata.get("region") or "",
+            "user_id": call.get("user_id") or "",
+            "timestamp": timestamp,
+            "duration": _float(metadata.get("duration")),
+            "final_score": _float(summary["score"]),
+            "total_score": _float(scoring.get("total_score")),
+            "avg_sentiment": _float(scoring.get("avg_sentiment")),
+            "grade": scoring.get("grade") or "",
+            "sop_passed": summary["passed"],
+            "failed_step_count": len(summary["failed_steps"]),
+            "risk_count": len(evaluation.get("risks_detected") or []),
+        }
+
+        step_rows = []
+        sop_results = evaluation.get("sop_adherence", {})
+        # Old list format has no sections
+        sections = sop_results.items() if isinstance(sop_results, dict) else [("", {"steps": sop_results})]
+        for section, data in sections:
+            if not isinstance(data, dict) or not isinstance(data.get("steps"), list):
+                continue
+            for idx, step in enumerate(data["steps"]):
+                if not isinstance(step, dict):
+                    continue
+                step_rows.append({
+                    "seq": seq,
+                    "call_id": call_row["call_id"],
+                    "region": call_row["region"],
+                    "user_id": call_row["user_id"],
+                    "timestamp": timestamp,
+                    "section": section,
+                    "section_score": _float(data.get("score")),
+                    "section_max_score": _float(data.get("max_score")),
+                    "step_index": idx,
+                    "step": step.get("step") or "",
+                    "status": step.get("status") or "",
+                    "confidence": _float(step.get("confidence")),
+                })
+        return call_row, step_rows
+
+    @staticmethod
+    def _columns(rows: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        columns = {}
+        for name in rows[0]:
+            values = [row[name] for row in rows]
+            if isinstance(values[0], str):
+                columns[name] = np.array(values, dtype=str)
+            elif isinstance(values[0], np.datetime64):
+                columns[name] = np.array(values, dtype="datetime64[ms]")
+            else:
+                columns[name] = np.array(values)
+        return columns
+
+    def _write_part(self, table: str, rows: List[Dict[str, Any]], part_name: str, fmt: str) -> str:
+        table_dir = os.path.join(self.export_dir, table)
+        os.makedirs(table_dir, exist_ok=True)
+        columns = self._columns(rows)
+        path = os.path.join(table_dir, f"{part_name}.{fmt}")
+        if fmt == "parquet":
+            pq.write_table(pa.table(columns), path)
+        else:
+            np.savez_compressed(path, **columns)
+        return path
+
+    def export(self, fmt: str = "npz") -> Dict[str, Any]:
+        """Append all calls saved since the last export as new part files."""
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        if fmt == "parquet" and pa is None:
+            raise ValueError("Parquet export requires pyarrow (pip install pyarrow)")
+
+        state = self._load_state()
+        watermark = self._watermark(state, fmt)
+        call_rows, step_rows = [], []
+        for seq, call in self.db_service.backend.iter_calls(after=watermark):
+            call_row, rows = self.build_rows(seq, call)
+            call_rows.append(call_row)
+            step_rows.extend(rows)
+
+        if not call_rows:
+            print("No new calls to export.")
+            return {"calls": 0, "steps": 0, "files": [], "last_seq": watermark}
+
+        first_seq, last_seq = call_rows[0]["seq"], call_rows[-1]["seq"]
+        part_name = f"part-{first_seq:09d}-{last_seq:09d}"
+        files = [self._write_part("calls", call_rows, part_name, fmt)]
+        if step_rows:
+            files.append(self._write_part("steps", step_rows, part_name, fmt))
+
+        # Advance the watermark only once the part files are on disk
+        marks = state["last_seq"] if isinstance(state.get("last_seq"), dict) else {}
+        state["last_seq"] = {**marks, fmt: last_seq}
+        self._save_state(state)
+        print(f"Exported {len(call_rows)} calls ({len(step_rows)} step results) to {self.export_dir}")
+        return {"calls": len(call_rows), "steps": len(step_rows), "files": files, "last_seq": last_seq}
+
+
+def load_npz_table(export_dir: str, table: str) -> Dict[str, np.ndarray]:
+    """Concatenate all .npz parts of an exported table into one dict of column arrays."""
+    parts = sorted(glob.glob(os.path.join(export_dir, table, "part-*.npz")))
+    if not parts:
+        return {}
+    loaded = [np.load(path) for path in parts]
+    return {name: np.concatenate([part[name] for part in loaded]) for name in loaded[0].files}
+
+
+if __name__ == "__main__":
+    import sys
+    from db_service import DBService
+
+    export_format = sys.argv[1] if len(sys.argv) > 1 else "npz"
+    AnalyticsExporter(DBService()).export(export_format)
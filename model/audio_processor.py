@@ -3,107 +3,183 @@ import torch
 import torchaudio
 import os
 import numpy as np
+from typing import List, Optional, Tuple
+import config
+
+# Whisper and pyannote both work on 16 kHz mono audio
+SAMPLE_RATE = 16000
+
+class DecodedAudio:
+    """
+    A call decoded once to 16 kHz mono float32 PCM, shared by trimming, Whisper and pyannote
+    so no stage has to decode or resample the upload again.
+    Long trimmed recordings are backed by a memory-mapped .npy file instead of process memory
+    (see allocate()), so they are paged in from disk as Whisper and pyannote read them.
+    """
+
+    sample_rate = SAMPLE_RATE
+
+    def __init__(self, samples: np.ndarray, source: Optional[str] = None, backing_path: Optional[str] = None):
+        self.samples = samples
+        self.source = source
+        self.backing_path = backing_path
+
+    @classmethod
+    def from_file(cls, path: str) -> "DecodedAudio":
+        """Decode and resample an audio file into memory."""
+        print(f"Decoding audio: {path}")
+        samples, _ = librosa.load(path, sr=SAMPLE_RATE, mono=True)
+        return cls(samples.astype(np.float32, copy=False), source=path)
+
+    @classmethod
+    def allocate(cls, n_samples: int, source: Optional[str] = None,
+                 mmap_min_seconds: Optional[float] = None) -> "DecodedAudio":
+        """
+        Zeroed buffer for n_samples of audio. At least mmap_min_seconds long (and with a source file
+        to put it next to), it is a writable memory-mapped .npy file instead of process memory.
+        """
+        threshold = config.AUDIO_MMAP_MIN_SECONDS if mmap_min_seconds is None else mmap_min_seconds
+        if source and threshold and n_samples / SAMPLE_RATE >= threshold:
+            backing_path = f"{os.path.splitext(source)[0]}.pcm.npy"
+            samples = np.lib.format.open_memmap(backing_path, mode="w+", dtype=np.float32, shape=(n_samples,))
+            return cls(samples, source=source, backing_path=backing_path)
+        return cls(np.zeros(n_samples, dtype=np.float32), source=source)
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / SAMPLE_RATE
+
+    def waveform_tensor(self) -> torch.Tensor:
+        """
+        (1, n_samples) tensor as expected by pyannote. It shares the buffer, memory-mapped or not,
+        so pyannote's sliding windows read it in place. torch cannot wrap a read-only array, so such
+        a buffer is copied into process memory first: the whole call is then held in RAM once more.
+        """
+        if self.samples.flags.writeable:
+            return torch.from_numpy(self.samples).unsqueeze(0)
+        return torch.tensor(np.asarray(self.samples)).unsqueeze(0)
+
+    def release(self):
+        """Drop the buffer and delete the memory-mapped backing file, if any."""
+        self.samples = np.zeros(0, dtype=np.float32)
+        if self.backing_path and os.path.exists(self.backing_path):
+            os.remove(self.backing_path)
+        self.backing_path = None
 
 class AudioProcessor:
     def __init__(self, silence_threshold_db=30):
         self.silence_threshold_db = silence_threshold_db
 
-    def trim_silences(self, input_path, output_path, keep_after=3.0, keep_before=1.0):
+    def keep_sections(self, y, sr, keep_after=3.0, keep_before=1.0) -> List[Tuple[int, int]]:
         """
-        Trims silences longer than keep_after + keep_before.
-        Keeps 'keep_after' seconds of silence after speech and 'keep_before' seconds before speech.
+        Sample ranges to keep: non-silent intervals padded by keep_before/keep_after,
+        merged where the padded intervals overlap. Empty if the audio is entirely silent.
         """
-        print(f"Loading audio for trimming: {input_path}")
-        y, sr = librosa.load(input_path, sr=None)
-        
         # Get non-silent intervals
         non_silent_intervals = librosa.effects.split(y, top_db=self.silence_threshold_db)
-        
+
         if len(non_silent_intervals) == 0:
-            # Entirely silent or below threshold? Return original
-            return False, 0, 0
-            
-        new_audio_segments = []
-        original_duration = len(y) / sr
-        
-        # Process first segment
-        first_start = non_silent_intervals[0][0]
-        # Keep 'keep_before' or everything before if less
-        start_trim = max(0, first_start - int(keep_before * sr))
-        
-        current_pos = start_trim
-        
-        for i in range(len(non_silent_intervals)):
-            interval_start, interval_end = non_silent_intervals[i]
-            
-            # Start of this non-silent section (with lead-in)
-            seg_start = max(0, interval_start - int(keep_before * sr))
-            
-            # If this is not the first segment, check the gap from previous
-            if i > 0:
-                prev_end = non_silent_intervals[i-1][1]
-                # We want to keep 'keep_after' from prev_end and 'keep_before' from interval_start
-                # The total gap allowed is keep_after + keep_before
-                gap_start_point = prev_end + int(keep_after * sr)
-                gap_end_point = interval_start - int(keep_before * sr)
-                
-                if gap_end_point > gap_start_point:
-                    # There is a long silence to trim
-                    # Extract up to gap_start_point
-                    # We already added up to previous interval_end in the previous iteration (or so we should)
-                    pass 
-            
-            # Simplified approach:
-            # Just keep non-silent intervals + padding, and merge if they overlap
-            pass
-
-        # Let's try a simpler robust approach:
+            return []
+
         # 1. Start with the first non-silent interval (with padding)
         # 2. For each subsequent interval, if it's "close enough" (gap <= keep_after + keep_before), merge.
         # 3. Else, cap the gap.
-        
-        processed_segments = []
-        
+        sections = []
+
         # Initial padding for the very first segment
-        start_pad = max(0, non_silent_intervals[0][0] - int(keep_before * sr))
-        end_pad = min(len(y), non_silent_intervals[0][1] + int(keep_after * sr))
-        
-        curr_start = start_pad
-        curr_end = end_pad
-        
+        curr_start = max(0, non_silent_intervals[0][0] - int(keep_before * sr))
+        curr_end = min(len(y), non_silent_intervals[0][1] + int(keep_after * sr))
+
         for i in range(1, len(non_silent_intervals)):
-            next_start_raw = non_silent_intervals[i][0]
-            next_end_raw = non_silent_intervals[i][1]
-            
-            next_start_padded = max(0, next_start_raw - int(keep_before * sr))
-            next_end_padded = min(len(y), next_end_raw + int(keep_after * sr))
-            
+            next_start_padded = max(0, non_silent_intervals[i][0] - int(keep_before * sr))
+            next_end_padded = min(len(y), non_silent_intervals[i][1] + int(keep_after * sr))
+
             # Max gap allowed is keep_after + keep_before (but we already padded them)
             # If they overlap or touch, merge
             if next_start_padded <= curr_end:
                 curr_end = next_end_padded
             else:
-                # Append current section
-                processed_segments.append(y[curr_start:curr_end])
+                sections.append((curr_start, curr_end))
                 curr_start = next_start_padded
                 curr_end = next_end_padded
-        
+
         # Append the last section
-        processed_segments.append(y[curr_start:curr_end])
-        
-        trimmed_y = np.concatenate(processed_segments)
-        
+        sections.append((curr_start, curr_end))
+        return sections
+
+    def split_on_silence(self, y, sr, max_chunk_seconds) -> List[Tuple[int, int]]:
+        """
+        Contiguous sample ranges covering y, each at most max_chunk_seconds long.
+        Cuts are placed in the middle of the silent gaps between non-silent intervals;
+        only speech running longer than a whole chunk without a gap is cut hard.
+        """
+        max_len = max(1, int(max_chunk_seconds * sr))
+        non_silent_intervals = librosa.effects.split(y, top_db=self.silence_threshold_db)
+        cuts = [(prev_end + next_start) // 2 for (_, prev_end), (next_start, _) in zip(non_silent_intervals[:-1], non_silent_intervals[1:])]
+        cuts.append(len(y))
+
+        chunks = []
+        start, last_cut = 0, None
+        for cut in cuts:
+            # Close the current chunk at the latest gap that still fits
+            while cut - start > max_len:
+                end = last_cut if last_cut is not None and last_cut > start else start + max_len
+                chunks.append((start, end))
+                start, last_cut = end, None
+            last_cut = cut
+        if start < len(y):
+            chunks.append((start, len(y)))
+        return chunks
+
+    def trim_silences(self, input_path, output_path, keep_after=3.0, keep_before=1.0):
+        """
+        Trims silences longer than keep_after + keep_before.
+        Keeps 'keep_after' seconds of silence after speech and 'keep_before' seconds before speech.
+        """
+        print(f"Loading audio for trimming: {input_path}")
+        y, sr = librosa.load(input_path, sr=None)
+
+        sections = self.keep_sections(y, sr, keep_after, keep_before)
+        if not sections:
+            # Entirely silent or below threshold? Return original
+            return False, 0, 0
+
+        original_duration = len(y) / sr
+        trimmed_y = np.concatenate([y[start:end] for start, end in sections])
+
         # Convert numpy to torch tensor for torchaudio saving
         # Librosa loads as (n_samples,) so we add a channel dim (1, n_samples)
         trimmed_tensor = torch.from_numpy(trimmed_y).unsqueeze(0)
         torchaudio.save(output_path, trimmed_tensor, sr)
-        
+
         new_duration = len(trimmed_y) / sr
         trimmed_amount = original_duration - new_duration
-        
+
         print(f"Trimming complete. Original: {original_duration:.2f}s, New: {new_duration:.2f}s, Trimmed: {trimmed_amount:.2f}s")
         return True, original_duration, new_duration
 
+    def trim_decoded(self, audio: DecodedAudio, keep_after=3.0, keep_before=1.0):
+        """
+        Variant of trim_silences working on an already decoded call; long results are memory-mapped.
+        Returns (trimmed DecodedAudio or None if entirely silent, original_duration, new_duration).
+        """
+        sections = self.keep_sections(audio.samples, SAMPLE_RATE, keep_after, keep_before)
+        original_duration = audio.duration
+        if not sections:
+            return None, original_duration, original_duration
+
+        # Filled section by section, so a memory-mapped result never exists in full in process memory
+        trimmed = DecodedAudio.allocate(sum(end - start for start, end in sections), source=audio.source)
+        position = 0
+        for start, end in sections:
+            trimmed.samples[position:position + end - start] = audio.samples[start:end]
+            position += end - start
+        if trimmed.backing_path:
+            trimmed.samples.flush()
+
+        print(f"Trimming complete. Original: {original_duration:.2f}s, New: {trimmed.duration:.2f}s, Trimmed: {original_duration - trimmed.duration:.2f}s")
+        return trimmed, original_duration, trimmed.duration
+
 if __name__ == "__main__":
     # Test
     processor = AudioProcessor()
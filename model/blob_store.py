@@ -0,0 +1,27 @@
+import hashlib
+import json
+from typing import Any
+from file_store import JSONFileStore
+
+
+class BlobStore(JSONFileStore):
+    """
+    Content-addressed store for large JSON payloads (transcripts, step reasons).
+    Blobs are named by the SHA-256 of their serialized content, so identical payloads
+    are stored once and a blob never changes after it is written.
+    """
+
+    def put(self, payload: Any) -> str:
+        """Store a JSON-serializable payload and return its reference."""
+        data = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        ref = hashlib.sha256(data).hexdigest()
+        if not self.contains(ref):
+            self.write(ref, data)
+        return ref
+
+    def get(self, ref: str) -> Any:
+        """Load a payload by reference. Returns None if the blob is missing."""
+        payload = self.read(ref)
+        if payload is None:
+            print(f"Blob {ref} not found in {self.root_dir}")
+        return payload
@@ -0,0 +1,111 @@
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class VersionedCache:
+    """
+    In-process LRU cache of parsed read results, invalidated as a whole whenever the
+    storage version changes (a new commit in SQLite, a new mtime for the JSON file).
+    Cached values are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, version_fn: Callable[[], Any], max_entries: int = 256):
+        self.version_fn = version_fn
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the cached value for key, calling loader() on a miss or after invalidation."""
+        if self.max_entries <= 0:
+            return loader()
+
+        version = self.version_fn()
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            elif key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = loader()
+        with self._lock:
+            # Don't keep a result computed against data that changed meanwhile
+            if self._version == version:
+                self._entries[key] = value
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class LRUCache:
+    """Bounded, thread-safe least-recently-used map with hit/miss counters."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+def _freeze(value) -> Hashable:
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def cached_read(method):
+    """Serve a read method of an object with a `cache` attribute through its VersionedCache."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (method.__name__, _freeze(args), _freeze(kwargs))
+        return self.cache.get_or_load(key, lambda: method(self, *args, **kwargs))
+    return wrapper
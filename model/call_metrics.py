@@ -0,0 +1,134 @@
+from datetime import datetime, time
+from typing import List, Dict, Any, Optional, Tuple
+
+# Region key under which the all-regions aggregates are stored
+ALL_REGIONS = "*"
+
+
+def parse_score(score) -> float:
+    """Parse a stored final_score which may be a number, None or a string like '82.5%'."""
+    if score is None:
+        return 0
+    if isinstance(score, str):
+        try:
+            return float(score.replace('%', ''))
+        except ValueError:
+            return 0
+    return score
+
+
+def failed_sop_steps(sop_results) -> List[str]:
+    """Names of failed SOP steps, for both the old list format and the section-based dict format."""
+    failures = []
+    if isinstance(sop_results, list):
+        # Old/Simple list format
+        for sop in sop_results:
+            if isinstance(sop, dict) and sop.get("status") == "FAIL":
+                failures.append(sop.get("step", "Unknown Step"))
+    elif isinstance(sop_results, dict):
+        # New Section-based format
+        for section_data in sop_results.values():
+            if isinstance(section_data, dict):
+                steps = section_data.get("steps", [])
+                if isinstance(steps, list):
+                    for step in steps:
+                        if isinstance(step, dict) and step.get("status") == "FAIL":
+                            failures.append(step.get("step", "Unknown Step"))
+    return failures
+
+
+def summarize_call(call: Dict[str, Any]) -> Dict[str, Any]:
+    """Derive the small scoring summary that the aggregates are built from."""
+    evaluation = call.get("evaluation", {}) or {}
+    scoring = evaluation.get("scoring", {}) or {}
+    failures = failed_sop_steps(evaluation.get("sop_adherence", {}))
+    return {
+        "score": parse_score(scoring.get("final_score", 0)),
+        "passed": not failures,
+        "failed_steps": failures,
+    }
+
+
+def call_regions(call: Dict[str, Any]) -> List[str]:
+    """Aggregate buckets a call contributes to: all regions plus its own region, if any."""
+    region = (call.get("metadata") or {}).get("region")
+    return [ALL_REGIONS, region] if region else [ALL_REGIONS]
+
+
+def classify_coaching(call: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Coaching-needs entry for a call, or None if it needs no review.
+    Criteria, by priority: Critical Risks, Score < 75, then any SOP failures.
+    """
+    evaluation = call.get("evaluation", {}) or {}
+    score = parse_score((evaluation.get("scoring", {}) or {}).get("final_score", 0))
+    risks = evaluation.get("risks_detected", [])
+
+    problem_title = ""
+    tags = []
+
+    # 1. Check for Risks (High Priority)
+    if risks:
+        risk = risks[0].get("risk", risks[0]) if isinstance(risks[0], dict) else risks[0]
+        problem_title = f"Risk Detected: {risk}"
+        tags.append("Critical Risk")
+
+    # 2. Check for Low Score
+    elif score < 75:
+        problem_title = f"Low Performance ({int(score)}%)"
+        tags.append("Performance")
+
+    # 3. Check for specific SOP failures
+    else:
+        failures = failed_sop_steps(evaluation.get("sop_adherence", {}))
+        if failures:
+            problem_title = f"SOP Violation: {failures[0]}"
+            if len(failures) > 1:
+                problem_title += f" (+{len(failures)-1} more)"
+            tags.append("SOP Violation")
+
+    if not problem_title:
+        return None
+
+    metadata = call.get("metadata") or {}
+    return {
+        "call_id": call.get("call_id"),
+        "date": call.get("timestamp"),
+        "problem_title": problem_title,
+        "score": score,
+        "region": metadata.get("region", "Unknown"),
+        "duration": metadata.get("duration", 0),
+        "tags": tags
+    }
+
+
+# Time granularities kept in the rollup tables, as strftime formats for the bucket key
+ROLLUP_GRANULARITIES = {
+    "hour": "%Y-%m-%dT%H:00",
+    "day": "%Y-%m-%d",
+}
+
+
+def time_bucket(timestamp, granularity: str, end_of_day: bool = False) -> Optional[str]:
+    """
+    Bucket key of an ISO timestamp (or date) for a granularity, None if it cannot be parsed.
+    A bare date stands for its midnight, or with end_of_day for its last instant, so that an
+    inclusive end date covers that day's later hourly buckets too.
+    """
+    if not timestamp:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(timestamp))
+    except ValueError:
+        return None
+    if end_of_day and len(str(timestamp)) <= len("YYYY-MM-DD"):
+        parsed = datetime.combine(parsed.date(), time.max)
+    return parsed.strftime(ROLLUP_GRANULARITIES[granularity])
+
+
+def rollup_dimensions(call: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(dimension, key) pairs a call is rolled up under: each of its regions plus its agent."""
+    dimensions = [("region", region) for region in call_regions(call)]
+    if call.get("user_id"):
+        dimensions.append(("agent", call["user_id"]))
+    return dimensions
@@ -0,0 +1,22 @@
+import numpy as np
+from faster_whisper import WhisperModel
+
+# Worker processes for long calls import only this module, never the app or its services.
+# Each process holds its own model, loaded once by init().
+_model = None
+
+
+def init(model_size: str, device: str, cpu_threads: int):
+    global _model
+    _model = WhisperModel(model_size, device=device, compute_type="float32", cpu_threads=cpu_threads)
+
+
+def transcribe(audio: np.ndarray, offset: float, language: str):
+    """Transcribes one chunk of a long call, times shifted by offset."""
+    segments, _ = _model.transcribe(audio, language=language, task="translate", beam_size=5)
+    return [{
+        "start": segment.start + offset,
+        "end": segment.end + offset,
+        "text": segment.text.strip(),
+        "speaker": "Unknown"
+    } for segment in segments]
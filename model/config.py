@@ -7,8 +7,48 @@ load_dotenv()
 HF_TOKEN = os.getenv("HF_TOKEN")
 WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "base")
 DEVICE = os.getenv("DEVICE", "cuda") # Change to cuda if GPU is available
+# Batched transcription: VAD chunks per forward pass (1 = sequential), files grouped per batch,
+# and how long (seconds) to wait for more queued files before running a batch
+WHISPER_BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", "8"))
+WHISPER_BATCH_FILES = int(os.getenv("WHISPER_BATCH_FILES", "4"))
+WHISPER_BATCH_WAIT = float(os.getenv("WHISPER_BATCH_WAIT", "0.2"))
+# Trimmed calls at least this long (seconds) are memory-mapped from disk instead of held in RAM
+AUDIO_MMAP_MIN_SECONDS = float(os.getenv("AUDIO_MMAP_MIN_SECONDS", "900"))
+# Diarizations that may run at once, alongside transcription
+DIARIZATION_WORKERS = int(os.getenv("DIARIZATION_WORKERS", "2"))
+# Persistent cache of transcripts/diarization keyed by audio content and model settings ("" disables)
+TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", "data/transcript_cache")
+# Cached transcripts unused for this many days are deleted (0 keeps them forever)
+TRANSCRIPT_CACHE_MAX_AGE_DAYS = float(os.getenv("TRANSCRIPT_CACHE_MAX_AGE_DAYS", "30"))
+# Long calls (/analyze-long-call) are cut at silences into chunks of at most this many seconds,
+# transcribed in parallel by this many worker processes (each loads its own Whisper model; 1 = in-process)
+LONG_CALL_CHUNK_SECONDS = float(os.getenv("LONG_CALL_CHUNK_SECONDS", "120"))
+LONG_CALL_WORKERS = int(os.getenv("LONG_CALL_WORKERS", str(max(1, (os.cpu_count() or 1) // 4))))
+# Live calls (/ws/analyze-call): min. seconds of audio per transcription window,
+# and seconds of newly transcribed audio between partial SOP checks
+STREAM_MIN_WINDOW = float(os.getenv("STREAM_MIN_WINDOW", "5"))
+STREAM_SOP_INTERVAL = float(os.getenv("STREAM_SOP_INTERVAL", "20"))
+# Filler words/phrases removed from transcripts (English and common Hinglish), comma-separated to override
+TEXT_FILLERS = [f.strip() for f in os.getenv(
+    "TEXT_FILLERS",
+    "umm,uhh,um,uh,hmm,ah,like,you know,basically,matlab,yaani,achha,acha,accha,arre,arey,yaar"
+).split(",") if f.strip()]
+SENTIMENT_MODEL = "distilbert-base-uncased-finetuned-sst-2-english"
+# Sentiment inference: "torch" (transformers pipeline) or "onnx" (ONNX Runtime on CPU; the model is
+# exported to SENTIMENT_ONNX_DIR on first use, dynamically quantized to int8 unless disabled)
+SENTIMENT_BACKEND = os.getenv("SENTIMENT_BACKEND", "torch")
+SENTIMENT_ONNX_DIR = os.getenv("SENTIMENT_ONNX_DIR", "data/onnx")
+SENTIMENT_ONNX_QUANTIZE = os.getenv("SENTIMENT_ONNX_QUANTIZE", "true").lower() in ("1", "true", "yes")
+# Distinct (normalized) texts whose sentiment is kept in memory (0 disables)
+SENTIMENT_CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", "10000"))
+# Transcript segments per sentiment forward pass
+SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "32"))
 SIMILARITY_MODEL = "all-MiniLM-L6-v2"
 SIMILARITY_THRESHOLD = 0.6
+# SOP steps are pre-screened with SIMILARITY_MODEL: best segment similarity >= SIMILARITY_THRESHOLD passes,
+# below SIMILARITY_FAIL_THRESHOLD fails, anything in between goes to the LLM judge
+SIMILARITY_PRESCREEN = os.getenv("SIMILARITY_PRESCREEN", "true").lower() in ("1", "true", "yes")
+SIMILARITY_FAIL_THRESHOLD = float(os.getenv("SIMILARITY_FAIL_THRESHOLD", "0.15"))
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 LLM_MODEL = "llama-3.3-70b-versatile"
 
@@ -17,6 +57,18 @@ SOP_RULES_PATH = os.path.join(BASE_DIR, "sop_rules.yaml")
 POLICIES_DIR = os.path.join(BASE_DIR, "policies")
 os.makedirs(POLICIES_DIR, exist_ok=True)
 
+# Call storage: "sqlite" (default) or the legacy single-file "json" backend.
+# A legacy calls.json is migrated into the SQLite database on first start.
+DB_BACKEND = os.getenv("DB_BACKEND", "sqlite")
+CALLS_JSON_PATH = os.getenv("CALLS_JSON_PATH", "data/calls.json")
+CALLS_DB_PATH = os.getenv("CALLS_DB_PATH", "data/calls.db")
+# Transcripts and per-step reasons are kept out of the call records, in a content-addressed store
+BLOB_DIR = os.getenv("BLOB_DIR", "data/blobs")
+# Max parsed read results kept in memory between writes (0 disables the cache)
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+# Columnar analytics exports (see analytics_export.py)
+EXPORT_DIR = os.getenv("EXPORT_DIR", "data/exports")
+
 def load_sop_rules():
     with open(SOP_RULES_PATH, "r") as f:
         return yaml.safe_load(f)
@@ -1,68 +1,234 @@
+import base64
 import json
-import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
 from datetime import datetime
-from collections import defaultdict
 import config
+from storage_backend import StorageBackend, SQLiteBackend, GroupCommitWriter, create_backend, migrate_json_to_sqlite
+from blob_store import BlobStore
+from call_cache import VersionedCache, cached_read
+from call_metrics import ALL_REGIONS, ROLLUP_GRANULARITIES, time_bucket
+
+# Fields returned for list views when `fields=summary` is requested (no transcript or step reasons)
+SUMMARY_FIELDS = [
+    "call_id",
+    "timestamp",
+    "user_id",
+    "name",
+    "email",
+    "metadata",
+    "evaluation.scoring",
+    "evaluation.resolution",
+    "evaluation.risks_detected",
+]
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a `fields=` query value ("summary" or comma-separated, dotted paths allowed)."""
+    if not fields:
+        return None
+    if fields.strip() == "summary":
+        return SUMMARY_FIELDS
+    return [f.strip() for f in fields.split(",") if f.strip()]
+
+def project_call(call: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Copy only the requested (possibly nested, dot-separated) fields of a call record."""
+    if not fields:
+        return call
+    projected: Dict[str, Any] = {}
+    for path in fields:
+        keys = path.split(".")
+        value = call
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            target = projected
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = value
+    return projected
+
+def needs_details(fields: Optional[List[str]]) -> bool:
+    """Whether a projection touches the transcript or the SOP step reasons kept in the blob store."""
+    if not fields:
+        return True
+    return any(
+        f.split(".")[0] == "transcript" or f == "evaluation" or f.startswith("evaluation.sop_adherence")
+        for f in fields
+    )
+
+def detach_details(call: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Split a call into its compact record and the heavy details (transcript and
+    per-step reasons). The input dict is left untouched.
+    """
+    record = dict(call)
+    details: Dict[str, Any] = {}
+    if "transcript" in record:
+        details["transcript"] = record.pop("transcript")
+
+    evaluation = record.get("evaluation")
+    sop_results = evaluation.get("sop_adherence") if isinstance(evaluation, dict) else None
+
+    def strip_reasons(steps):
+        reasons = [s.get("reason") if isinstance(s, dict) else None for s in steps]
+        stripped = [{k: v for k, v in s.items() if k != "reason"} if isinstance(s, dict) else s for s in steps]
+        return stripped, reasons
+
+    if isinstance(sop_results, list):
+        stripped, details["sop_reasons"] = strip_reasons(sop_results)
+        record["evaluation"] = {**evaluation, "sop_adherence": stripped}
+    elif isinstance(sop_results, dict):
+        stripped_sections, reasons = {}, {}
+        for section, data in sop_results.items():
+            if isinstance(data, dict) and isinstance(data.get("steps"), list):
+                steps, reasons[section] = strip_reasons(data["steps"])
+                stripped_sections[section] = {**data, "steps": steps}
+            else:
+                stripped_sections[section] = data
+        details["sop_reasons"] = reasons
+        record["evaluation"] = {**evaluation, "sop_adherence": stripped_sections}
+
+    return record, details
+
+def attach_details(record: Dict[str, Any], details: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Inverse of detach_details: rebuild the full call from its record and details."""
+    call = {k: v for k, v in record.items() if k != "detail_ref"}
+    if not details:
+        return call
+    if "transcript" in details:
+        call["transcript"] = details["transcript"]
+
+    reasons = details.get("sop_reasons")
+    evaluation = call.get("evaluation")
+    sop_results = evaluation.get("sop_adherence") if isinstance(evaluation, dict) else None
+
+    def restore_reasons(steps, step_reasons):
+        return [
+            {**s, "reason": r} if isinstance(s, dict) and r is not None else s
+            for s, r in zip(steps, step_reasons)
+        ]
+
+    if isinstance(sop_results, list) and isinstance(reasons, list):
+        call["evaluation"] = {**evaluation, "sop_adherence": restore_reasons(sop_results, reasons)}
+    elif isinstance(sop_results, dict) and isinstance(reasons, dict):
+        restored = {}
+        for section, data in sop_results.items():
+            if section in reasons and isinstance(data, dict):
+                restored[section] = {**data, "steps": restore_reasons(data.get("steps", []), reasons[section])}
+            else:
+                restored[section] = data
+        call["evaluation"] = {**evaluation, "sop_adherence": restored}
+    return call
 
 class DBService:
-    def __init__(self, db_path: str = "data/calls.json"):
+    def __init__(self, db_path: Optional[str] = None, backend: Optional[str] = None):
+        self.backend_kind = backend or config.DB_BACKEND
+        if db_path is None:
+            db_path = config.CALLS_DB_PATH if self.backend_kind == "sqlite" else config.CALLS_JSON_PATH
         self.db_path = db_path
+        self.blob_store = BlobStore(config.BLOB_DIR)
         self.ensure_db_exists()
 
     def ensure_db_exists(self):
-        """Ensure the JSON database file and its directory exist."""
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        if not os.path.exists(self.db_path):
-            with open(self.db_path, "w") as f:
-                json.dump([], f)
+        """Open (and create if needed) the configured storage backend."""
+        if getattr(self, "writer", None):
+            self.writer.close()
+        self.backend: StorageBackend = create_backend(self.backend_kind, self.db_path)
+        if isinstance(self.backend, SQLiteBackend):
+            migrate_json_to_sqlite(config.CALLS_JSON_PATH, self.backend, transform=self._store_details)
+        self.writer = GroupCommitWriter(self.backend)
+        # Repeated reads are served from memory until the next commit changes the storage version
+        self.cache = VersionedCache(self.backend.version, max_entries=config.CACHE_MAX_ENTRIES)
+
+    def _store_details(self, call: Dict[str, Any]) -> Dict[str, Any]:
+        """Move the transcript and step reasons to the blob store, returning the compact record."""
+        if "detail_ref" in call:
+            return call
+        record, details = detach_details(call)
+        if details:
+            record["detail_ref"] = self.blob_store.put(details)
+        return record
+
+    def _load_details(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Rebuild the full call for detail views. Records saved before the blob store are returned as-is."""
+        ref = record.get("detail_ref")
+        if not ref:
+            return record
+        return attach_details(record, self.blob_store.get(ref))
 
     def load_calls(self) -> List[Dict]:
-        """Load all calls from the JSON database."""
-        try:
-            with open(self.db_path, "r") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return []
+        """Load all calls from the database."""
+        return self.backend.load_all()
 
     def save_call(self, call_data: Dict[str, Any]):
         """Save a new call record to the database."""
-        calls = self.load_calls()
-        
         # Add timestamp if not present
         if "timestamp" not in call_data:
             call_data["timestamp"] = datetime.now().isoformat()
             
-        calls.append(call_data)
-        
-        with open(self.db_path, "w") as f:
-            json.dump(calls, f, indent=2)
+        # Concurrent saves are batched into a single transaction by the group-commit writer
+        self.writer.submit(self._store_details(call_data))
 
+    @cached_read
     def get_calls(self, region: Optional[str] = None, user_id: Optional[str] = None) -> List[Dict]:
-        """Get calls, optionally filtered by region and/or user_id."""
-        calls = self.load_calls()
-        if region:
-            calls = [c for c in calls if c.get("metadata", {}).get("region") == region]
-        if user_id:
-            calls = [c for c in calls if c.get("user_id") == user_id]
-        return calls
-
-    def get_call(self, call_id: str) -> Optional[Dict]:
-        """Get a specific call by ID."""
-        calls = self.load_calls()
-        for call in calls:
-            if call.get("call_id") == call_id:
-                return call
-        return None
+        """Get calls (with transcripts), optionally filtered by region and/or user_id."""
+        return [self._load_details(c) for c in self.backend.find_calls(region, user_id)]
+
+    def get_calls_page(self, region: Optional[str] = None, user_id: Optional[str] = None,
+                       cursor: Optional[str] = None, limit: Optional[int] = None,
+                       fields: Optional[List[str]] = None) -> Tuple[Iterable[Dict], Optional[str]]:
+        """
+        Cursor-paginated listing of calls in insertion order.
+        Returns the (projected) records and the cursor of the next page, if any.
+        Without a limit the records are a lazy iterator over the whole result.
+        """
+        if cursor and not cursor.isdigit():
+            raise ValueError(f"Invalid cursor: {cursor}")
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be a positive integer")
+        after = int(cursor) if cursor else None
+        if limit is not None:
+            # Bounded pages are small enough to keep in the cache; unbounded listings stay streamed
+            key = ("get_calls_page", region, user_id, after, limit, tuple(fields) if fields else None)
+            return self.cache.get_or_load(key, lambda: self._load_calls_page(region, user_id, after, limit, fields))
+        return self._iter_projected(region, user_id, after, None, fields), None
+
+    def _iter_projected(self, region, user_id, after, limit, fields) -> Iterator[Dict]:
+        # Summary projections are served from the compact records without touching the blob store
+        hydrate = needs_details(fields)
+        for _, call in self.backend.iter_calls(region, user_id, after=after, limit=limit):
+            yield project_call(self._load_details(call) if hydrate else call, fields)
+
+    def _load_calls_page(self, region, user_id, after, limit, fields) -> Tuple[List[Dict], Optional[str]]:
+        next_cursor = None
+        # Only sequence numbers are read to find the next cursor
+        seqs = self.backend.page_seqs(region, user_id, after=after, limit=limit + 1)
+        if len(seqs) > limit:
+            next_cursor = str(seqs[limit - 1])
+        return list(self._iter_projected(region, user_id, after, limit, fields)), next_cursor
+
+    @cached_read
+    def get_call(self, call_id: str, include_transcript: bool = True) -> Optional[Dict]:
+        """
+        Get a specific call by ID.
+        The transcript and step reasons are only loaded from the blob store if include_transcript is set.
+        """
+        call = self.backend.find_call(call_id)
+        if call and include_transcript:
+            return self._load_details(call)
+        return call
 
+    @cached_read
     def get_aggregated_insights(self, region: Optional[str] = None) -> Dict[str, Any]:
         """
-        Generate aggregated insights from stored calls.
-        If region is provided, filters data for that region.
+        Generate aggregated insights from the running per-region aggregates.
+        If region is provided, returns the aggregates for that region.
         """
-        calls = self.get_calls(region)
+        stats = self.backend.region_stats(region, top_n=5)
+        total_calls = stats["total_calls"]
         
-        if not calls:
+        if not total_calls:
             return {
                 "total_calls": 0,
                 "average_score": 0,
@@ -72,62 +238,8 @@ class DBService:
                 "region": region if region else "All Regions"
             }
 
-        total_calls = len(calls)
-        total_score = 0
-        passed_sop_count = 0
-        failed_sops = defaultdict(int)
-        sentiment_scores = []
-        
-        for call in calls:
-            evaluation = call.get("evaluation", {})
-            scoring = evaluation.get("scoring", {})
-            
-            # Score
-            score = scoring.get("final_score", 0) or 0
-            if isinstance(score, str):
-                try:
-                    score = float(score.replace('%', ''))
-                except ValueError:
-                    score = 0
-            total_score += score
-            
-            # SOP Adherence
-            sop_results = evaluation.get("sop_adherence", {})
-            # If it's a list (old format), iterate directly. If dict (new format), iterate values then steps.
-            all_passed = True
-            
-            if isinstance(sop_results, list):
-                # Old/Simple list format
-                for sop in sop_results:
-                    if isinstance(sop, dict) and sop.get("status") == "FAIL":
-                        all_passed = False
-                        step_name = sop.get("step", "Unknown Step")
-                        failed_sops[step_name] += 1
-            elif isinstance(sop_results, dict):
-                # New Section-based format
-                for section_name, section_data in sop_results.items():
-                    # Check if section_data has 'steps' list
-                    if isinstance(section_data, dict):
-                        steps = section_data.get("steps", [])
-                        if isinstance(steps, list):
-                            for step in steps:
-                                if isinstance(step, dict) and step.get("status") == "FAIL":
-                                    all_passed = False
-                                    step_name = step.get("step", "Unknown Step")
-                                    failed_sops[step_name] += 1
-            
-            if all_passed:
-                passed_sop_count += 1
-                
-            # Sentiment (taking average of trajectory if available, or just end sentiment)
-            # This is a simplification; a real system might process the trajectory more deeply.
-            # Assuming we can derive a simple sentiment metric here or just track count.
-            
-        avg_score = total_score / total_calls if total_calls > 0 else 0
-        sop_pass_rate = (passed_sop_count / total_calls * 100) if total_calls > 0 else 0
-        
-        # Sort common issues
-        sorted_issues = sorted(failed_sops.items(), key=lambda x: x[1], reverse=True)
+        avg_score = stats["score_sum"] / total_calls
+        sop_pass_rate = stats["pass_count"] / total_calls * 100
         
         insights = {
             "region": region if region else "All Regions",
@@ -136,92 +248,94 @@ class DBService:
             "sop_pass_rate": round(sop_pass_rate, 2),
             "common_sop_failures": [
                 {"step": k, "count": v, "percentage": round(v/total_calls*100, 1)} 
-                for k, v in sorted_issues[:5]
+                for k, v in stats["failed_steps"]
             ],
             "recent_calls_summary": [
                  {
                      "call_id": c.get("call_id"),
                      "score": c.get("evaluation", {}).get("scoring", {}).get("final_score"),
                      "date": c.get("timestamp")
-                 } for c in calls[-5:] # Last 5 calls
+                 } for c in self.backend.recent_calls(region, limit=5)
             ]
         }
         
         return insights
 
-    def get_coaching_needs(self) -> List[Dict]:
+    @cached_read
+    def get_insights_timeseries(self, start: Optional[str] = None, end: Optional[str] = None,
+                                granularity: str = "day", region: Optional[str] = None,
+                                user_id: Optional[str] = None, top_n: int = 3) -> Dict[str, Any]:
         """
-        Identify calls that need coaching and format them for the dashboard.
-        Criteria: Critical Risks OR Score < 75 OR Any SOP Failures
+        Hourly or daily insights between two ISO dates/timestamps (inclusive), for all regions,
+        one region or one agent (user_id). Served from the rollup tables maintained in save_call.
         """
-        calls = self.load_calls()
-        needs = []
-        
-        print(f"DEBUG: Processing {len(calls)} calls for coaching needs")
-        
-        for call in calls:
-            eval_data = call.get("evaluation", {})
-            scoring = eval_data.get("scoring", {})
-            
-            # Robust score parsing
-            score = scoring.get("final_score", 0)
-            if score is None: score = 0
-            if isinstance(score, str):
-                try:
-                    score = float(score.replace('%', ''))
-                except ValueError:
-                    score = 0
-            
-            risks = eval_data.get("risks_detected", [])
-            sop_data = eval_data.get("sop_adherence", {})
-            
-            problem_title = ""
-            tags = []
-            
-            # 1. Check for Risks (High Priority)
-            if risks:
-                problem_title = f"Risk Detected: {risks[0]}"
-                tags.append("Critical Risk")
-            
-            # 2. Check for Low Score
-            elif score < 75:
-                problem_title = f"Low Performance ({int(score)}%)"
-                tags.append("Performance")
-                
-            # 3. Check for specific SOP failures
-            else:
-                failures = []
-                # Handle both dict (new) and list (old) format
-                if isinstance(sop_data, dict):
-                    for section, data in sop_data.items():
-                        if isinstance(data, dict):
-                            for step in data.get("steps", []):
-                                if step.get("status") == "FAIL":
-                                    failures.append(step.get("step"))
-                elif isinstance(sop_data, list):
-                    for step in sop_data:
-                        if step.get("status") == "FAIL":
-                            failures.append(step.get("step"))
-                
-                if failures:
-                    problem_title = f"SOP Violation: {failures[0]}"
-                    if len(failures) > 1:
-                        problem_title += f" (+{len(failures)-1} more)"
-                    tags.append("SOP Violation")
-            
-            # If any issue found, add to list
-            if problem_title:
-                needs.append({
-                    "call_id": call.get("call_id"),
-                    "date": call.get("timestamp"),
-                    "problem_title": problem_title,
-                    "score": score,
-                    "region": call.get("metadata", {}).get("region", "Unknown"),
-                    "duration": call.get("metadata", {}).get("duration", 0),
-                    "tags": tags
-                })
-        
-        print(f"DEBUG: Found {len(needs)} calls needing coaching")
-        # Sort by date (newest first)
-        needs.sort(key=lambda x: x.get("date", ""), reverse=True)
-        return needs
+        if granularity not in ROLLUP_GRANULARITIES:
+            raise ValueError(f"granularity must be one of: {', '.join(ROLLUP_GRANULARITIES)}")
+        if region and user_id:
+            raise ValueError("Filter by region or user_id, not both")
+
+        bounds = {}
+        for name, value in (("start", start), ("end", end)):
+            bounds[name] = time_bucket(value, granularity, end_of_day=name == "end") if value else None
+            if value and bounds[name] is None:
+                raise ValueError(f"Invalid {name} date: {value}")
+
+        dimension, key = ("agent", user_id) if user_id else ("region", region or ALL_REGIONS)
+        series = self.backend.rollup_series(granularity, dimension, key,
+                                            start=bounds["start"], end=bounds["end"], top_n=top_n)
+        return {
+            "granularity": granularity,
+            "region": region if region else "All Regions",
+            "user_id": user_id,
+            "start": start,
+            "end": end,
+            "buckets": [
+                {
+                    "bucket": b["bucket"],
+                    "total_calls": b["total_calls"],
+                    "average_score": round(b["score_sum"] / b["total_calls"], 2),
+                    "sop_pass_rate": round(b["pass_count"] / b["total_calls"] * 100, 2),
+                    "top_failed_steps": [
+                        {"step": step, "count": count, "percentage": round(count/b["total_calls"]*100, 1)}
+                        for step, count in b["failed_steps"]
+                    ]
+                } for b in series
+            ]
+        }
+
+    @cached_read
+    def get_coaching_needs(self, tag: Optional[str] = None, region: Optional[str] = None,
+                           cursor: Optional[str] = None,
+                           limit: Optional[int] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Page through calls that need coaching, newest first.
+        Calls are classified once in save_call (Critical Risks OR Score < 75 OR Any SOP Failures),
+        so this only reads the precomputed queue. Returns the entries and the next page's cursor.
+        """
+        after = None
+        if cursor:
+            try:
+                date, seq = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+                after = (str(date), int(seq))
+            except (ValueError, TypeError):
+                raise ValueError(f"Invalid cursor: {cursor}")
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be a positive integer")
+
+        page = self.backend.coaching_page(tag, region, after=after, limit=limit + 1 if limit else None)
+        next_cursor = None
+        if limit is not None and len(page) > limit:
+            page = page[:limit]
+            next_cursor = base64.urlsafe_b64encode(json.dumps(list(page[-1][0])).encode()).decode()
+        return [entry for _, entry in page], next_cursor
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python db_service.py <calls.json> <calls.db>")
+        sys.exit(1)
+    # Same migration DBService runs on startup, so transcripts and step reasons go to the blob store
+    config.CALLS_JSON_PATH = sys.argv[1]
+    DBService(sys.argv[2], backend="sqlite").writer.close()
@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "w", fsync: bool = False):
+    """
+    Open a temp file next to `path` for writing and rename it over `path` on success,
+    so readers see either the old or the new content, never a partial file.
+    With fsync the data is flushed to disk before the rename.
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, encoding=None if "b" in mode else "utf-8") as f:
+            yield f
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class JSONFileStore:
+    """
+    JSON documents stored one file per key under root_dir. Keys are hex digests; files
+    are fanned out by the first two characters to keep directories small.
+    """
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root_dir, key[:2], f"{key}.json")
+
+    def contains(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def read(self, key: str) -> Optional[Any]:
+        """The document for a key, or None if it is missing or unreadable."""
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def write(self, key: str, data: bytes):
+        """Store already serialized JSON under a key, atomically."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_write(path, "wb") as f:
+            f.write(data)
+
+    def paths(self) -> Iterator[str]:
+        """Path of every stored document (and any temp file left by an interrupted write)."""
+        for entry in os.scandir(self.root_dir):
+            if entry.is_dir():
+                for child in os.scandir(entry.path):
+                    yield child.path
@@ -0,0 +1,68 @@
+from collections import deque
+from typing import Any, Iterable, List, Tuple
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over many keywords (or phrases), each carrying a payload.
+    A text is scanned once, whatever the number of keywords. Matching is case-insensitive
+    and on whole words only: "police" does not match inside "policies".
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, Any]]):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out: List[List[Tuple[int, Any]]] = [[]]
+        self.size = 0
+
+        for keyword, payload in keywords:
+            keyword = keyword.strip().lower()
+            if not keyword:
+                continue
+            state = 0
+            for ch in keyword:
+                if ch not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][ch] = len(self._goto) - 1
+                state = self._goto[state][ch]
+            self._out[state].append((len(keyword), payload))
+            self.size += 1
+
+        # Failure links, breadth-first; each state also reports the matches of its fallback state
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for ch, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0) if self._goto[fallback].get(ch) != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                pending.append(child)
+
+    def find_all(self, text: str) -> List[Tuple[int, int, Any]]:
+        """(start, end, payload) of every whole-word keyword occurrence, by end position."""
+        text = text.lower()
+        matches = []
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                end = i + 1
+                # Only check the right boundary once per position; it is the same for all matches here
+                if end < len(text) and _is_word_char(text[end]):
+                    continue
+                for length, payload in out[state]:
+                    start = end - length
+                    if start == 0 or not _is_word_char(text[start - 1]):
+                        matches.append((start, end, payload))
+        return matches
@@ -2,6 +2,7 @@ import os
 import json
 import httpx
 import config
+from typing import Iterable, Optional
 
 class SOPConverter:
     def __init__(self):
@@ -114,11 +115,17 @@ class SOPConverter:
             print(f"Error calling Groq API for suggestion: {e}")
             return {"intent": raw_instruction, "suggestion": "Error"}
 
-    def evaluate_call(self, transcript_text: str, sop_rules: dict, policy_text: str = "") -> dict:
+    def evaluate_call(self, transcript_text: str, sop_rules: dict, policy_text: str = "", step_ids: Optional[Iterable[str]] = None) -> dict:
         """
         Evaluates the call transcript against the SOP rules using the LLM as a judge.
         Optional policy_text acts as authoritative constraints/guardrails.
+        If step_ids is given, only those steps ("Section::index") are put in the checklist.
         """
+        if step_ids is not None:
+            step_ids = set(step_ids)
+            if not step_ids:
+                return {}
+
         if not self.api_key or "your_groq_api_key" in self.api_key:
             print("Warning: GROQ_API_KEY not configured. Cannot perform LLM evaluation.")
             return {} # Should handle fallback or error upstream
@@ -127,8 +134,14 @@ class SOPConverter:
         checklist_prompt = ""
         flat_steps = []
         for section, details in sop_rules.items():
+            section_steps = [
+                (idx, step) for idx, step in enumerate(details.get("steps", []))
+                if step_ids is None or f"{section}::{idx}" in step_ids
+            ]
+            if not section_steps:
+                continue
             checklist_prompt += f"\nSection: {section}\n"
-            for idx, step in enumerate(details.get("steps", [])):
+            for idx, step in section_steps:
                 # Use internal_intent if available (it's the descriptive objective), or text
                 objective = step.get("internal_intent", step["text"])
                 step_id = f"{section}::{idx}" 
@@ -1,19 +1,40 @@
+if __name__ == "__main__":
+    # `python main.py` serves through `python -m uvicorn main:app`, so this file is never the
+    # __main__ script: spawned processes (the long-call workers in stt_service) re-import the
+    # __main__ script, and must not build the services below
+    import os
+    import sys
+    os.execv(sys.executable, [sys.executable, "-m", "uvicorn", "main:app", "--host", "0.0.0.0", "--port", "8000"])
 
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks, Form
+from fastapi import FastAPI, UploadFile, File, BackgroundTasks, Form, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
 import shutil
 import os
 import uuid
+import json
+import asyncio
+from contextlib import asynccontextmanager
 from stt_service import STTService
+from stream_transcriber import StreamTranscriber
 from nlp_processor import NLPProcessor
 from sop_engine import SOPEngine
 from scoring_service import ScoringService
-from audio_processor import AudioProcessor
+from audio_processor import AudioProcessor, DecodedAudio
 from policy_processor import PolicyProcessor
-from db_service import DBService
+from db_service import DBService, parse_fields
+from model_loader import ModelLoader
+from semantic_matcher import SemanticMatcher
 from typing import Optional
 import config
 
-app = FastAPI(title="Battery Smart Auto-QA & Coaching System")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models load after the server is listening; /ready reports when they are warm
+    models.start()
+    yield
+
+app = FastAPI(title="Battery Smart Auto-QA & Coaching System", lifespan=lifespan)
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -23,11 +44,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Initialize services
-stt_service = STTService()
-nlp_processor = NLPProcessor()
+# Whisper/pyannote and the sentiment model are loaded in the background (see ModelLoader)
+models = ModelLoader({
+    "stt": STTService,
+    "nlp": NLPProcessor,
+    **({"similarity": SemanticMatcher} if config.SIMILARITY_PRESCREEN else {})
+}, optional=["similarity"])
 sop_engine = SOPEngine()
 scoring_service = ScoringService()
 audio_processor = AudioProcessor()
@@ -38,6 +64,10 @@ from llm_service import SOPConverter # Moved here as per instruction's implied p
 import yaml # Moved here as per instruction's implied placement
 sop_converter = SOPConverter()
 
+def semantic_matcher():
+    """The embedding pre-screen for SOP steps, or None when it is disabled or failed to load."""
+    return models.get("similarity") if config.SIMILARITY_PRESCREEN else None
+
 @app.get("/sop-rules")
 @app.get("/sop_rules")
 def get_sop_rules():
@@ -57,6 +87,10 @@ async def update_sop(rules: dict):
                 # or if we want to refresh it
                 step["internal_intent"] = sop_converter.convert_to_intent(step["text"])
         
+        # Keep top-level sections the client didn't send (e.g. transcript_sections)
+        for key, value in config.SOP_RULES.items():
+            rules.setdefault(key, value)
+        
         # Save to yaml
         with open(config.SOP_RULES_PATH, "w") as f:
             yaml.dump(rules, f, default_flow_style=False)
@@ -64,6 +98,7 @@ async def update_sop(rules: dict):
         # Refresh local config and engine
         config.SOP_RULES = rules
         sop_engine.rules = rules["sop_rules"]
+        sop_engine.load_risk_keywords(rules.get("sentiments", {}).get("risk_keywords", sop_engine.risks))
         
         return {"status": "success", "message": "SOP rules updated and intents extracted"}
     except Exception as e:
@@ -115,28 +150,158 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 def read_root():
     return {"message": "Welcome to Battery Smart Auto-QA System API"}
 
+@app.get("/ready")
+def get_ready():
+    """Readiness probe: 200 once all models are loaded and warmed up, 503 until then."""
+    return JSONResponse({"ready": models.ready, "models": models.status()}, status_code=200 if models.ready else 503)
+
+@app.get("/cache-stats")
+def get_cache_stats():
+    """Hit/miss counters of the caches; models that are still loading are left out."""
+    stats = {"calls": db_service.cache.stats()}
+    try:
+        stats["sentiment"] = models.get("nlp", timeout=0).sentiment_cache.stats()
+    except RuntimeError:
+        pass
+    try:
+        transcript_cache = models.get("stt", timeout=0).transcript_cache
+        if transcript_cache:
+            stats["transcripts"] = transcript_cache.stats()
+    except RuntimeError:
+        pass
+    return stats
+
 @app.get("/insights")
 def get_insights(region: Optional[str] = None):
     """Get aggregated insights, optionally filtered by region/city."""
     return db_service.get_aggregated_insights(region)
 
+def stream_json_array(items):
+    """Serialize an iterator as a JSON array one element at a time."""
+    yield "["
+    for i, item in enumerate(items):
+        yield ("," if i else "") + json.dumps(item)
+    yield "]"
+
+@app.get("/insights/timeseries")
+def get_insights_timeseries(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    granularity: str = "day",
+    region: Optional[str] = None,
+    user_id: Optional[str] = None
+):
+    """Get hourly/daily insights over a date range, for all regions, one region or one agent."""
+    try:
+        return db_service.get_insights_timeseries(start, end, granularity=granularity, region=region, user_id=user_id)
+    except ValueError as e:
+        return {"error": str(e)}
+
 @app.get("/calls")
-def get_calls(region: Optional[str] = None, user_id: Optional[str] = None):
-    """Get list of calls, optionally filtered."""
-    return db_service.get_calls(region, user_id)
+def get_calls(
+    region: Optional[str] = None,
+    user_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None
+):
+    """
+    Get list of calls, optionally filtered.
+    Pass `limit` to paginate: the next page's cursor is returned in the X-Next-Cursor header.
+    `fields` selects a projection, e.g. `fields=summary` or `fields=call_id,evaluation.scoring`.
+    """
+    try:
+        records, next_cursor = db_service.get_calls_page(
+            region, user_id, cursor=cursor, limit=limit, fields=parse_fields(fields)
+        )
+    except ValueError as e:
+        return {"error": str(e)}
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return StreamingResponse(stream_json_array(records), media_type="application/json", headers=headers)
 
 @app.get("/call/{call_id}")
-def get_call(call_id: str):
-    """Get a specific call."""
-    call = db_service.get_call(call_id)
+def get_call(call_id: str, include_transcript: bool = True):
+    """Get a specific call. Set include_transcript=false to skip loading the transcript."""
+    call = db_service.get_call(call_id, include_transcript=include_transcript)
     if not call:
         return {"error": "Call not found"}
     return call
 
 @app.get("/coaching-needs")
-def get_coaching_needs():
-    """Get list of calls requiring coaching/review."""
-    return db_service.get_coaching_needs()
+def get_coaching_needs(
+    tag: Optional[str] = None,
+    region: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None
+):
+    """
+    Get list of calls requiring coaching/review, newest first.
+    Pass `limit` to paginate: the next page's cursor is returned in the X-Next-Cursor header.
+    """
+    try:
+        needs, next_cursor = db_service.get_coaching_needs(tag, region, cursor=cursor, limit=limit)
+    except ValueError as e:
+        return {"error": str(e)}
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return JSONResponse(needs, headers=headers)
+
+def parse_custom_rules(sop_rules: Optional[str]):
+    """SOP rules posted with a call (JSON with a top-level "sop_rules" key), or None."""
+    if not sop_rules:
+        return None
+    try:
+        parsed = json.loads(sop_rules)
+        if "sop_rules" in parsed:
+            return parsed["sop_rules"]
+    except Exception as e:
+        print(f"Error parsing SOP rules: {e}")
+    return None
+
+def evaluate_transcription(transcription, custom_rules=None, sop_id=None):
+    """
+    Evaluates a diarized transcript (updated in place with roles and cleaned text).
+    Returns the evaluation fields of a call record.
+    """
+    nlp_processor = models.get("nlp")
+    
+    # B. Identify Speaker Roles (Agent vs Customer)
+    speaker_mapping = sop_converter.identify_speakers(transcription)
+    if speaker_mapping:
+        print(f"DEBUG: Speaker Mapping Found: {speaker_mapping}")
+        for seg in transcription:
+            original_speaker = seg.get("speaker", "Unknown")
+            if original_speaker in speaker_mapping:
+                seg["speaker"] = speaker_mapping[original_speaker]
+    
+    # C. NLP Processing (Cleaning & Segmentation)
+    nlp_processor.clean_transcript(transcription)
+    
+    segmented_transcript = nlp_processor.segment_transcript(transcription)
+    sentiment_trajectory = nlp_processor.get_sentiment_trajectory(transcription)
+    
+    # D. SOP & Scoring
+    sop_results = sop_engine.check_adherence(
+        transcription, segmented_transcript, rules=custom_rules, sop_id=sop_id, semantic_matcher=semantic_matcher()
+    )
+    risks = sop_engine.detect_risks(transcription)
+    resolution_status = sop_engine.validate_resolution(segmented_transcript, sop_results)
+    
+    scoring_summary = scoring_service.calculate_final_score(sop_results, sentiment_trajectory)
+    coaching_insights = scoring_service.generate_coaching_insights(sop_results)
+    alerts = scoring_service.generate_alerts(sop_results, risks, scoring_summary)
+    
+    return {
+        "segmented_transcript_summary": {section: len(segs) for section, segs in segmented_transcript.items()},
+        "evaluation": {
+            "sop_adherence": sop_results,
+            "resolution": resolution_status,
+            "risks_detected": risks,
+            "scoring": scoring_summary
+        },
+        "coaching_insights": coaching_insights,
+        "supervisor_alerts": alerts,
+        "speaker_mapping": speaker_mapping # Store for debugging
+    }
 
 @app.post("/analyze-call/")
 async def analyze_call(
@@ -158,44 +323,16 @@ async def analyze_call(
     
     try:
         # Parse custom SOP rules if provided
-        custom_rules = None
-        if sop_rules:
-            try:
-                import json
-                parsed = json.loads(sop_rules)
-                if "sop_rules" in parsed:
-                    custom_rules = parsed["sop_rules"]
-            except Exception as e:
-                print(f"Error parsing SOP rules: {e}")
+        custom_rules = parse_custom_rules(sop_rules)
 
         # 2. Process Pipeline
         # A. Transcription & Diarization
-        transcription, info = stt_service.process_call(file_path)
-        
-        # B. Identify Speaker Roles (Agent vs Customer)
-        speaker_mapping = sop_converter.identify_speakers(transcription)
-        if speaker_mapping:
-            print(f"DEBUG: Speaker Mapping Found: {speaker_mapping}")
-            for seg in transcription:
-                original_speaker = seg.get("speaker", "Unknown")
-                if original_speaker in speaker_mapping:
-                    seg["speaker"] = speaker_mapping[original_speaker]
+        # Off the event loop, so concurrent uploads can share a transcription batch
+        stt_service = await run_in_threadpool(models.get, "stt")
+        transcription, info = await run_in_threadpool(stt_service.process_call, file_path)
         
-        # C. NLP Processing (Cleaning & Segmentation)
-        for seg in transcription:
-            seg["text"] = nlp_processor.clean_text(seg["text"])
-        
-        segmented_transcript = nlp_processor.segment_transcript(transcription)
-        sentiment_trajectory = nlp_processor.get_sentiment_trajectory(transcription)
-        
-        # D. SOP & Scoring
-        sop_results = sop_engine.check_adherence(transcription, segmented_transcript, rules=custom_rules, sop_id=sop_id)
-        risks = sop_engine.detect_risks(transcription)
-        resolution_status = sop_engine.validate_resolution(segmented_transcript, sop_results)
-        
-        scoring_summary = scoring_service.calculate_final_score(sop_results, sentiment_trajectory)
-        coaching_insights = scoring_service.generate_coaching_insights(sop_results)
-        alerts = scoring_service.generate_alerts(sop_results, risks, scoring_summary)
+        # B-D. Speaker roles, NLP, SOP & Scoring
+        evaluation = await run_in_threadpool(evaluate_transcription, transcription, custom_rules, sop_id)
         
         # 3. Clean up (Optional: move to a processed folder instead of deleting)
         # os.remove(file_path)
@@ -209,23 +346,14 @@ async def analyze_call(
                 "region": region
             },
             "transcript": transcription,
-            "segmented_transcript_summary": {section: len(segs) for section, segs in segmented_transcript.items()},
-            "evaluation": {
-                "sop_adherence": sop_results,
-                "resolution": resolution_status,
-                "risks_detected": risks,
-                "scoring": scoring_summary
-            },
-            "coaching_insights": coaching_insights,
-            "supervisor_alerts": alerts,
+            **evaluation,
             "user_id": user_id,
             "email": email,
-            "name": name,
-            "speaker_mapping": speaker_mapping # Store for debugging
+            "name": name
         }
         
         # Save to DB
-        db_service.save_call(result)
+        await run_in_threadpool(db_service.save_call, result)
         
         return result
         
@@ -246,59 +374,36 @@ async def analyze_long_call(
     file_id = str(uuid.uuid4())
     file_ext = os.path.splitext(file.filename)[1]
     original_file_path = os.path.join(UPLOAD_DIR, f"{file_id}_orig{file_ext}")
-    trimmed_file_path = os.path.join(UPLOAD_DIR, f"{file_id}{file_ext}")
     
     with open(original_file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
     
+    audio = None
     try:
-        # 2. Trim Silences
-        success, orig_dur, new_dur = audio_processor.trim_silences(original_file_path, trimmed_file_path)
+        # 2. Decode once, then trim silences in memory; the trimmed buffer feeds Whisper and pyannote directly
+        audio = await run_in_threadpool(DecodedAudio.from_file, original_file_path)
+        trimmed_audio, orig_dur, new_dur = await run_in_threadpool(audio_processor.trim_decoded, audio)
         
         # If trimming failed (e.g. file too quiet), use original
-        if not success:
-            shutil.copy(original_file_path, trimmed_file_path)
+        if trimmed_audio is None:
+            trimmed_audio = audio
             new_dur = orig_dur
+        else:
+            # Only the trimmed copy (memory-mapped when long) is needed from here on
+            audio.release()
+            audio = trimmed_audio
 
         # Parse custom SOP rules if provided
-        custom_rules = None
-        if sop_rules:
-            try:
-                import json
-                parsed = json.loads(sop_rules)
-                if "sop_rules" in parsed:
-                    custom_rules = parsed["sop_rules"]
-            except Exception as e:
-                print(f"Error parsing SOP rules: {e}")
-
-        # 3. Process Pipeline (using the trimmed file)
+        custom_rules = parse_custom_rules(sop_rules)
+
+        # 3. Process Pipeline (using the trimmed audio)
         # A. Transcription & Diarization
-        transcription, info = stt_service.process_call(trimmed_file_path)
-        
-        # B. Identify Speaker Roles (Agent vs Customer)
-        speaker_mapping = sop_converter.identify_speakers(transcription)
-        if speaker_mapping:
-            print(f"DEBUG: Speaker Mapping Found: {speaker_mapping}")
-            for seg in transcription:
-                original_speaker = seg.get("speaker", "Unknown")
-                if original_speaker in speaker_mapping:
-                    seg["speaker"] = speaker_mapping[original_speaker]
-        
-        # C. NLP Processing (Cleaning & Segmentation)
-        for seg in transcription:
-            seg["text"] = nlp_processor.clean_text(seg["text"])
-        
-        segmented_transcript = nlp_processor.segment_transcript(transcription)
-        sentiment_trajectory = nlp_processor.get_sentiment_trajectory(transcription)
+        # Off the event loop, so concurrent uploads can share a transcription batch
+        stt_service = await run_in_threadpool(models.get, "stt")
+        transcription, info = await run_in_threadpool(stt_service.process_call, trimmed_audio, long_call=True)
         
-        # D. SOP & Scoring
-        sop_results = sop_engine.check_adherence(transcription, segmented_transcript, rules=custom_rules, sop_id=sop_id)
-        risks = sop_engine.detect_risks(transcription)
-        resolution_status = sop_engine.validate_resolution(segmented_transcript, sop_results)
-        
-        scoring_summary = scoring_service.calculate_final_score(sop_results, sentiment_trajectory)
-        coaching_insights = scoring_service.generate_coaching_insights(sop_results)
-        alerts = scoring_service.generate_alerts(sop_results, risks, scoring_summary)
+        # B-D. Speaker roles, NLP, SOP & Scoring
+        evaluation = await run_in_threadpool(evaluate_transcription, transcription, custom_rules, sop_id)
         
         result = {
             "call_id": file_id,
@@ -312,23 +417,14 @@ async def analyze_long_call(
                 "region": region
             },
             "transcript": transcription,
-            "segmented_transcript_summary": {section: len(segs) for section, segs in segmented_transcript.items()},
-            "evaluation": {
-                "sop_adherence": sop_results,
-                "resolution": resolution_status,
-                "risks_detected": risks,
-                "scoring": scoring_summary
-            },
-            "coaching_insights": coaching_insights,
-            "supervisor_alerts": alerts,
+            **evaluation,
             "user_id": user_id,
             "email": email,
-            "name": name,
-            "speaker_mapping": speaker_mapping # Store for debugging
+            "name": name
         }
         
         # Save to DB
-        db_service.save_call(result)
+        await run_in_threadpool(db_service.save_call, result)
         
         return result
         
@@ -336,6 +432,121 @@ async def analyze_long_call(
         import traceback
         print(traceback.format_exc())
         return {"error": str(e)}
+    finally:
+        if audio is not None:
+            audio.release()
+
+@app.websocket("/ws/analyze-call")
+async def analyze_call_stream(
+    websocket: WebSocket,
+    encoding: str = "pcm_s16le",
+    sop_id: Optional[str] = None,
+    region: Optional[str] = None,
+    user_id: Optional[str] = None,
+    email: Optional[str] = None,
+    name: Optional[str] = None
+):
+    """
+    Live call analysis. The client streams 16 kHz mono PCM (`encoding`: pcm_s16le or pcm_f32le)
+    as binary messages and sends the text message "stop" when the call ends.
+    The server sends JSON messages:
+      {"type": "segment", ...}     each transcript segment as soon as Whisper yields it
+      {"type": "risk", ...}        risk keywords found in a new segment
+      {"type": "sop_update", ...}  SOP adherence of the transcript so far, every STREAM_SOP_INTERVAL seconds of audio
+      {"type": "result", ...}      the full evaluation (diarized and saved) after "stop"
+      {"type": "error", ...}
+    """
+    await websocket.accept()
+    try:
+        stt_service = await run_in_threadpool(models.get, "stt")
+        stream = StreamTranscriber(stt_service, encoding=encoding)
+    except (ValueError, RuntimeError) as e:
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close()
+        return
+
+    send_lock = asyncio.Lock()
+    async def send(message):
+        async with send_lock:
+            await websocket.send_json(message)
+
+    reported_risks = set()
+    sop_task = None
+    last_sop_check = None
+
+    async def check_sop(transcript, transcribed_until):
+        try:
+            matcher = await run_in_threadpool(semantic_matcher)
+            sop_results = await run_in_threadpool(sop_engine.check_adherence, transcript, {}, sop_id=sop_id, semantic_matcher=matcher)
+            await send({"type": "sop_update", "transcribed_until": transcribed_until, "sop_adherence": sop_results})
+        except Exception as e:
+            print(f"Partial SOP check failed: {e}")
+
+    async def transcribe_pending(final=False):
+        nonlocal sop_task, last_sop_check
+        while True:
+            window = await run_in_threadpool(stream.next_window, final)
+            if window is None:
+                return
+            segments = await run_in_threadpool(stream.transcribe_window, window)
+            while True:
+                # Pull one segment at a time so each is sent as soon as it is decoded
+                segment = await run_in_threadpool(next, segments, None)
+                if segment is None:
+                    break
+                index = len(stream.segments) - 1
+                await send({"type": "segment", "index": index, **segment})
+                for risk in sop_engine.detect_risks([segment], first_index=index):
+                    if risk["risk"] not in reported_risks:
+                        reported_risks.add(risk["risk"])
+                        await send({"type": "risk", **risk})
+
+            # Partial SOP checks run in the background, one at a time, while audio keeps arriving
+            due = last_sop_check is None or stream.transcribed_until - last_sop_check >= config.STREAM_SOP_INTERVAL
+            if not final and stream.segments and due and (sop_task is None or sop_task.done()):
+                last_sop_check = stream.transcribed_until
+                transcript = [dict(seg) for seg in stream.segments]
+                sop_task = asyncio.create_task(check_sop(transcript, stream.transcribed_until))
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes"):
+                stream.add_audio(message["bytes"])
+                await transcribe_pending()
+            elif (message.get("text") or "").strip().lower() == "stop":
+                break
+
+        await transcribe_pending(final=True)
+        if sop_task:
+            await sop_task
+
+        # Speakers need the whole call, so diarization and the full evaluation run once at the end
+        transcription = await run_in_threadpool(stream.diarize)
+        evaluation = await run_in_threadpool(evaluate_transcription, transcription, None, sop_id)
+        result = {
+            "call_id": str(uuid.uuid4()),
+            "metadata": {**stream.metadata(), "region": region, "is_live_call": True},
+            "transcript": transcription,
+            **evaluation,
+            "user_id": user_id,
+            "email": email,
+            "name": name
+        }
+        await run_in_threadpool(db_service.save_call, result)
+        await send({"type": "result", "result": result})
+        await websocket.close()
+    except WebSocketDisconnect:
+        print("Live call stream disconnected before it was stopped; nothing saved.")
+        if sop_task:
+            sop_task.cancel()
+    except Exception as e:
+        import traceback
+        print(traceback.format_exc())
+        await send({"type": "error", "error": str(e)})
+        await websocket.close()
 
 @app.post("/process-sop-intents")
 async def process_sop_intents(rules: dict):
@@ -356,8 +567,3 @@ async def process_sop_intents(rules: dict):
         return {"status": "success", "processed_rules": rules}
     except Exception as e:
         return {"status": "error", "message": str(e)}
-
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
-
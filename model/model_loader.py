@@ -0,0 +1,68 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class ModelLoader:
+    """
+    Builds the heavy model-backed services in a background thread once the server is up,
+    warming each one with a dummy inference (its `warm_up()` method, if any), so endpoints
+    that need no model answer right away. Endpoints that do call get(), which waits for the model.
+    Optional models are ones the app can run without: if one fails to load, get() returns None
+    for it and it does not hold back readiness.
+    """
+
+    def __init__(self, factories: Dict[str, Callable[[], Any]], optional: Iterable[str] = ()):
+        self.factories = factories
+        self.optional = set(optional)
+        self._services: Dict[str, Any] = {}
+        self._status: Dict[str, Dict[str, Any]] = {name: {"state": "pending"} for name in factories}
+        self._loaded = {name: threading.Event() for name in factories}
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="model-loader", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        for name, factory in self.factories.items():
+            started = time.monotonic()
+            self._status[name] = {"state": "loading"}
+            try:
+                service = factory()
+                self._status[name] = {"state": "warming_up"}
+                if hasattr(service, "warm_up"):
+                    service.warm_up()
+                self._services[name] = service
+                self._status[name] = {"state": "ready", "seconds": round(time.monotonic() - started, 2)}
+                print(f"Model '{name}' ready in {time.monotonic() - started:.1f}s")
+            except Exception as e:
+                print(f"Error loading model '{name}': {e}")
+                self._status[name] = {"state": "failed", "error": str(e)}
+            finally:
+                self._loaded[name].set()
+
+    @property
+    def ready(self) -> bool:
+        return all(
+            status["state"] == "ready" or (name in self.optional and status["state"] == "failed")
+            for name, status in self._status.items()
+        )
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dict(status) for name, status in self._status.items()}
+
+    def get(self, name: str, timeout: Optional[float] = None) -> Any:
+        """
+        The loaded service, waiting for it if it is still loading. Raises RuntimeError if it
+        failed, unless it is optional, in which case None is returned.
+        """
+        self.start()
+        if not self._loaded[name].wait(timeout):
+            raise RuntimeError(f"Model '{name}' is still loading")
+        if name not in self._services:
+            if name in self.optional:
+                return None
+            raise RuntimeError(f"Model '{name}' failed to load: {self._status[name].get('error')}")
+        return self._services[name]
@@ -1,76 +1,130 @@
 from transformers import pipeline
+from typing import List, Optional
+import numpy as np
+import torch
+from text_normalizer import TextNormalizer
+from call_cache import LRUCache
+from section_classifier import SectionClassifier
 import config
-import re
+
+# Sentiment trajectory: one row per segment, signed score (-1..1) at the segment start time
+SENTIMENT_TRAJECTORY_DTYPE = np.dtype([("time", np.float64), ("score", np.float32)])
 
 class NLPProcessor:
-    def __init__(self):
-        print("Loading Sentiment Analysis model...")
-        self.sentiment_analyzer = pipeline(
-            "sentiment-analysis", 
-            model="distilbert-base-uncased-finetuned-sst-2-english",
-            device=0 if config.DEVICE == "cuda" else -1
-        )
+    def __init__(self, backend: Optional[str] = None):
+        # "torch": transformers pipeline; "onnx": exported (optionally int8) model on ONNX Runtime
+        self.backend = backend or config.SENTIMENT_BACKEND
+        self.sentiment_analyzer = None
+        self.onnx_model = None
+        if self.backend == "onnx":
+            from sentiment_onnx import OnnxSentimentModel
+            print("Loading Sentiment Analysis model (ONNX Runtime)...")
+            self.onnx_model = OnnxSentimentModel.load_or_export(
+                config.SENTIMENT_MODEL, config.SENTIMENT_ONNX_DIR, quantize=config.SENTIMENT_ONNX_QUANTIZE
+            )
+            self.tokenizer = self.onnx_model.tokenizer
+            self.id2label = self.onnx_model.id2label
+        elif self.backend == "torch":
+            print("Loading Sentiment Analysis model...")
+            self.sentiment_analyzer = pipeline(
+                "sentiment-analysis", 
+                model=config.SENTIMENT_MODEL,
+                device=0 if config.DEVICE == "cuda" else -1
+            )
+            self.tokenizer = self.sentiment_analyzer.tokenizer
+            self.id2label = self.sentiment_analyzer.model.config.id2label
+        else:
+            raise ValueError(f"Unknown sentiment backend: {self.backend}")
+        self.positive_label_id = next(i for i, label in self.id2label.items() if label.upper() == "POSITIVE")
+        self.normalizer = TextNormalizer(config.TEXT_FILLERS)
+        # Stock phrases ("hello", "thank you") recur across calls; their sentiment is computed once
+        self.sentiment_cache = LRUCache(config.SENTIMENT_CACHE_SIZE)
+        self.section_classifier = SectionClassifier(config.SOP_RULES.get("transcript_sections"))
+
+    def warm_up(self):
+        self.analyze_sentiment("Thank you for calling Battery Smart.")
 
     def clean_text(self, text: str):
         # Remove filler words and extra whitespace
-        fillers = r'\b(umm|uhh|ah|like|you know|basically)\b'
-        text = re.sub(fillers, '', text, flags=re.IGNORECASE)
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
+        return self.normalizer.normalize(text)
+
+    def clean_transcript(self, transcription):
+        """Cleans the text of every segment in place, in one pass over the whole transcript."""
+        cleaned = self.normalizer.normalize_all([segment["text"] for segment in transcription])
+        for segment, text in zip(transcription, cleaned):
+            segment["text"] = text
+        return transcription
 
     def segment_transcript(self, transcription):
-        total_segments = len(transcription)
-        if total_segments == 0:
-            return {}
-        
-        sections = {
-            "Greeting": [],
-            "Problem Identification": [],
-            "Diagnosis / Action": [],
-            "Resolution": [],
-            "Closure": []
-        }
-        
-        for i, segment in enumerate(transcription):
-            text = segment["text"].lower()
-            
-            # Greeting: Usually the first 2-3 segments or specific keywords
-            if i < 3 and ("welcome" in text or "hello" in text or "hi" in text or "smart" in text):
-                sections["Greeting"].append(segment)
-            # Closure: Usually the last 2-3 segments or specific keywords
-            elif i > total_segments - 4 and ("thank you" in text or "bye" in text or "great day" in text or "help" in text):
-                sections["Closure"].append(segment)
-            # Problem: Keywords like problem, issue, work, charging
-            elif "problem" in text or "issue" in text or "not working" in text or "not charging" in text:
-                sections["Problem Identification"].append(segment)
-            # Resolution: Keywords like fixed, resolved, done, hour, time
-            elif "fixed" in text or "resolved" in text or "done" in text or "restart" in text or "hours" in text:
-                sections["Resolution"].append(segment)
-            else:
-                # Fallback based on position
-                if i < total_segments * 0.2:
-                    sections["Greeting"].append(segment)
-                elif i < total_segments * 0.5:
-                    sections["Problem Identification"].append(segment)
-                elif i < total_segments * 0.7:
-                    sections["Diagnosis / Action"].append(segment)
-                elif i < total_segments * 0.9:
-                    sections["Resolution"].append(segment)
-                else:
-                    sections["Closure"].append(segment)
-                    
-        return sections
+        return self.section_classifier.segment(transcription)
 
     def analyze_sentiment(self, text: str):
-        result = self.sentiment_analyzer(text)[0]
-        return result # {'label': 'POSITIVE', 'score': 0.99}
+        labels, scores = self._classify([text])
+        return {"label": self.id2label[int(labels[0])], "score": float(scores[0])} # {'label': 'POSITIVE', 'score': 0.99}
+
+    def _class_probabilities(self, features) -> np.ndarray:
+        """Class probabilities for one batch of tokenized texts, padded here."""
+        if self.onnx_model:
+            return self.onnx_model.predict_proba(self.tokenizer.pad(features, return_tensors="np"))
+        model = self.sentiment_analyzer.model
+        batch = self.tokenizer.pad(features, return_tensors="pt")
+        with torch.inference_mode():
+            logits = model(**{key: value.to(model.device) for key, value in batch.items()}).logits
+            return torch.softmax(logits.float(), dim=-1).cpu().numpy()
+
+    @staticmethod
+    def _sentiment_key(text: str) -> str:
+        # The model is uncased and splits on whitespace, so this normalization never changes its output
+        return " ".join(text.lower().split())
+
+    def _classify(self, texts: List[str]):
+        """
+        (label ids, label scores) per text. Texts seen before (after normalization) are served from
+        the sentiment cache; the rest are sorted by token length and run in padded batches of
+        SENTIMENT_BATCH_SIZE, so each batch is padded only to the length of similar texts.
+        """
+        labels = np.zeros(len(texts), dtype=np.int64)
+        scores = np.zeros(len(texts), dtype=np.float32)
+        if not texts:
+            return labels, scores
+
+        # Unique uncached texts, and the positions each one fills
+        pending = {}
+        for i, text in enumerate(texts):
+            key = self._sentiment_key(text)
+            cached = self.sentiment_cache.get(key)
+            if cached is not None:
+                labels[i], scores[i] = cached
+            else:
+                pending.setdefault(key, []).append(i)
+        if not pending:
+            return labels, scores
+
+        keys = list(pending)
+        encoded = self.tokenizer(keys, truncation=True)
+        order = np.argsort([len(ids) for ids in encoded["input_ids"]], kind="stable")
+
+        batch_size = max(1, config.SENTIMENT_BATCH_SIZE)
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            probs = self._class_probabilities({key: [encoded[key][i] for i in idx] for key in encoded.keys()})
+            batch_labels = probs.argmax(axis=1)
+            batch_scores = probs[np.arange(len(idx)), batch_labels]
+            for j, label, score in zip(idx, batch_labels, batch_scores):
+                positions = pending[keys[j]]
+                labels[positions] = label
+                scores[positions] = score
+                self.sentiment_cache.put(keys[j], (int(label), float(score)))
+        return labels, scores
+
+    def sentiment_scores(self, texts: List[str]) -> np.ndarray:
+        """Signed sentiment per text: the score for POSITIVE, minus the score otherwise."""
+        labels, scores = self._classify(texts)
+        return np.where(labels == self.positive_label_id, scores, -scores).astype(np.float32)
 
-    def get_sentiment_trajectory(self, transcription):
-        trajectory = []
-        for segment in transcription:
-            sent = self.analyze_sentiment(segment["text"])
-            trajectory.append({
-                "time": segment["start"],
-                "score": sent["score"] if sent["label"] == "POSITIVE" else -sent["score"]
-            })
+    def get_sentiment_trajectory(self, transcription) -> np.ndarray:
+        """Signed sentiment of every segment, as a SENTIMENT_TRAJECTORY_DTYPE array in segment order."""
+        trajectory = np.zeros(len(transcription), dtype=SENTIMENT_TRAJECTORY_DTYPE)
+        trajectory["time"] = [segment["start"] for segment in transcription]
+        trajectory["score"] = self.sentiment_scores([segment["text"] for segment in transcription])
         return trajectory
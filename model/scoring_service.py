@@ -7,7 +7,8 @@ class ScoringService:
             total_score += res["score"]
             
         # Sentiment penalty/bonus (example logic)
-        avg_sentiment = sum([t["score"] for t in sentiment_trajectory]) / len(sentiment_trajectory) if sentiment_trajectory else 0
+        sentiment_scores = [float(t["score"]) for t in sentiment_trajectory]
+        avg_sentiment = sum(sentiment_scores) / len(sentiment_scores) if sentiment_scores else 0
         sentiment_mod = avg_sentiment * 10 # -10 to +10 range
         
         final_score = min(max(total_score + sentiment_mod, 0), max_possible)
@@ -0,0 +1,66 @@
+from typing import Any, Dict, List, Optional
+from keyword_matcher import KeywordMatcher
+
+# Used when sop_rules.yaml has no (or an empty) transcript_sections
+DEFAULT_SECTIONS: Dict[str, Dict[str, Any]] = {
+    "Greeting": {"priority": 1, "first_segments": 3, "fallback_until": 0.2,
+                 "keywords": ["welcome", "hello", "hi", "smart"]},
+    "Problem Identification": {"priority": 3, "fallback_until": 0.5,
+                               "keywords": ["problem", "issue", "not working", "not charging"]},
+    "Diagnosis / Action": {"fallback_until": 0.7, "keywords": []},
+    "Resolution": {"priority": 4, "fallback_until": 0.9,
+                   "keywords": ["fixed", "resolved", "done", "restart", "hours"]},
+    "Closure": {"priority": 2, "last_segments": 3, "fallback_until": 1.0,
+                "keywords": ["thank you", "bye", "great day", "help"]},
+}
+
+
+class SectionClassifier:
+    """
+    Assigns transcript segments to call sections (Greeting, Closure, ...) as configured under
+    `transcript_sections` in sop_rules.yaml. All sections' keywords are compiled into one
+    automaton, so each segment is classified with a single scan of its text.
+    Without any configured section, DEFAULT_SECTIONS is used.
+    """
+
+    def __init__(self, sections: Optional[Dict[str, Dict[str, Any]]] = None):
+        sections = sections or DEFAULT_SECTIONS
+        # Output (and positional fallback) order follows the position in the call
+        self.sections = sorted(sections.items(), key=lambda item: item[1].get("fallback_until", 1.0))
+        self.names = [name for name, _ in self.sections]
+        self.matcher = KeywordMatcher(
+            (keyword, name) for name, section in self.sections for keyword in section.get("keywords") or []
+        )
+
+    def _in_window(self, section: Dict[str, Any], index: int, total: int) -> bool:
+        if "first_segments" in section and index >= section["first_segments"]:
+            return False
+        if "last_segments" in section and index < total - section["last_segments"]:
+            return False
+        return True
+
+    def classify(self, text: str, index: int, total: int) -> str:
+        """Section of the index-th of total segments."""
+        matched = {name for _, _, name in self.matcher.find_all(text)}
+        candidates = [
+            (section.get("priority", float("inf")), name)
+            for name, section in self.sections
+            if name in matched and self._in_window(section, index, total)
+        ]
+        if candidates:
+            return min(candidates)[1]
+
+        for name, section in self.sections:
+            if index < total * section.get("fallback_until", 1.0):
+                return name
+        return self.names[-1]
+
+    def segment(self, transcription: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Segments grouped by section, every configured section present."""
+        total = len(transcription)
+        if total == 0:
+            return {}
+        sections = {name: [] for name in self.names}
+        for i, segment in enumerate(transcription):
+            sections[self.classify(segment["text"], i, total)].append(segment)
+        return sections
@@ -0,0 +1,89 @@
+import numpy as np
+from typing import Any, Dict, List, Optional
+from sentence_transformers import SentenceTransformer
+from call_cache import LRUCache
+import config
+
+
+class SemanticMatcher:
+    """
+    Local pre-screen of SOP steps before the LLM judge. Each step's objective (its internal_intent)
+    and every transcript segment are embedded with SIMILARITY_MODEL; a step whose best cosine
+    similarity to any segment is at least SIMILARITY_THRESHOLD passes, one that stays below
+    SIMILARITY_FAIL_THRESHOLD fails, and everything in between is left to the LLM.
+    Step embeddings are computed once per objective text and cached.
+    """
+
+    def __init__(self, model_name: Optional[str] = None):
+        model_name = model_name or config.SIMILARITY_MODEL
+        print(f"Loading similarity model ({model_name})...")
+        self.model = SentenceTransformer(model_name, device=config.DEVICE)
+        self.pass_threshold = config.SIMILARITY_THRESHOLD
+        self.fail_threshold = config.SIMILARITY_FAIL_THRESHOLD
+        self.step_embeddings = LRUCache(4096)
+
+    def warm_up(self):
+        self._encode(["Thank you for calling Battery Smart."])
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
+
+    def _embed_objectives(self, objectives: List[str]) -> np.ndarray:
+        vectors = [self.step_embeddings.get(text) for text in objectives]
+        missing = sorted({text for text, vector in zip(objectives, vectors) if vector is None})
+        if missing:
+            for text, vector in zip(missing, self._encode(missing)):
+                self.step_embeddings.put(text, vector)
+            vectors = [self.step_embeddings.get(text) for text in objectives]
+        return np.stack(vectors)
+
+    def prescreen(self, transcription: List[Dict[str, Any]], rules: Dict[str, Any], allow_pass: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Confident verdicts keyed by step ID ("Section::index"), in the format the LLM judge returns.
+        Steps missing from the result still need the LLM. With allow_pass=False only FAILs are decided
+        (a policy may turn an apparently fulfilled step into a violation, which only the LLM can judge).
+        When the segments carry Agent/Customer roles, a PASS must come from an Agent segment.
+        """
+        steps = [
+            (f"{section}::{idx}", step.get("internal_intent") or step["text"])
+            for section, details in rules.items()
+            for idx, step in enumerate(details.get("steps", []))
+        ]
+        segments = [seg for seg in transcription if seg.get("text", "").strip()]
+        if not steps or not segments:
+            return {}
+
+        similarity = self._encode([seg["text"] for seg in segments]) @ self._embed_objectives([objective for _, objective in steps]).T
+        best_segment = similarity.argmax(axis=0)
+        best_score = similarity[best_segment, np.arange(len(steps))]
+
+        # Once roles are known, only the agent's own words can pass a step; a customer line that happens
+        # to echo the objective ("can you verify my number?") is no proof the agent did it
+        speakers = {seg.get("speaker") for seg in segments}
+        if {"Agent", "Customer"} <= speakers:
+            agent_rows = np.array([i for i, seg in enumerate(segments) if seg.get("speaker") == "Agent"])
+            pass_segment = agent_rows[similarity[agent_rows].argmax(axis=0)]
+            pass_score = similarity[pass_segment, np.arange(len(steps))]
+        else:
+            pass_segment, pass_score = best_segment, best_score
+
+        decided = {}
+        for i, (step_id, _) in enumerate(steps):
+            score, match_score = float(best_score[i]), float(pass_score[i])
+            if allow_pass and match_score >= self.pass_threshold:
+                segment = segments[pass_segment[i]]
+                decided[step_id] = {
+                    "status": "PASS",
+                    "reason": f"Semantically matched (similarity {match_score:.2f}) by: \"{segment['text']}\"",
+                    "confidence": round(match_score, 2),
+                    "matched_text": segment["text"],
+                    "timestamp": segment.get("start")
+                }
+            elif score < self.fail_threshold:
+                # Nothing from either side comes close, so no reading of the call can fulfil the step
+                decided[step_id] = {
+                    "status": "FAIL",
+                    "reason": f"Nothing in the call resembles this step (best similarity {score:.2f}).",
+                    "confidence": round(1 - score, 2)
+                }
+        return decided
@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+import numpy as np
+from typing import Dict, List
+from transformers import AutoConfig, AutoTokenizer
+
+try:
+    import onnxruntime as ort
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+except ImportError:
+    ort = None
+
+
+class OnnxSentimentModel:
+    """
+    Sentiment classifier exported to ONNX (optionally int8-quantized) and run with ONNX Runtime
+    on CPU. Exposes the same tokenizer and labels as the transformers model it was exported from.
+    """
+
+    def __init__(self, model_path: str, model_name: str):
+        if ort is None:
+            raise ValueError("The ONNX sentiment backend requires onnxruntime (pip install onnxruntime)")
+        self.model_path = model_path
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.id2label = {int(i): label for i, label in AutoConfig.from_pretrained(model_name).id2label.items()}
+        self.session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    @classmethod
+    def load_or_export(cls, model_name: str, output_dir: str, quantize: bool = True) -> "OnnxSentimentModel":
+        """Load the exported model from output_dir, exporting (and quantizing) it first if missing."""
+        fp32_path = os.path.join(output_dir, "sentiment.onnx")
+        model_path = os.path.join(output_dir, "sentiment.int8.onnx") if quantize else fp32_path
+        if not os.path.exists(model_path):
+            if ort is None:
+                raise ValueError("The ONNX sentiment backend requires onnxruntime (pip install onnxruntime)")
+            os.makedirs(output_dir, exist_ok=True)
+            if not os.path.exists(fp32_path):
+                export_onnx(model_name, fp32_path)
+            if quantize:
+                print(f"Quantizing {fp32_path} to int8...")
+                quantize_dynamic(fp32_path, model_path, weight_type=QuantType.QInt8)
+        print(f"Loading ONNX sentiment model: {model_path}")
+        return cls(model_path, model_name)
+
+    def predict_proba(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        """Class probabilities for a padded batch (input_ids, attention_mask as int64 arrays)."""
+        inputs = {name: np.asarray(features[name], dtype=np.int64) for name in self.input_names}
+        logits = self.session.run(["logits"], inputs)[0].astype(np.float32)
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+def export_onnx(model_name: str, output_path: str):
+    """Export a transformers sequence classifier to ONNX with dynamic batch and sequence axes."""
+    import torch
+    from transformers import AutoModelForSequenceClassification
+
+    print(f"Exporting {model_name} to ONNX: {output_path}")
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+    model.config.return_dict = False
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    sample = tokenizer(["Export sample text."], return_tensors="pt")
+    dynamic_axes = {"input_ids": {0: "batch", 1: "sequence"}, "attention_mask": {0: "batch", 1: "sequence"}, "logits": {0: "batch"}}
+    with torch.inference_mode():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            output_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+
+
+def parity_report(reference, candidate, texts: List[str]) -> Dict[str, float]:
+    """
+    Compare two NLPProcessor instances (e.g. PyTorch vs ONNX) on the same texts:
+    label agreement, score differences and the time each took.
+    """
+    started = time.perf_counter()
+    expected = reference.sentiment_scores(texts)
+    reference_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = candidate.sentiment_scores(texts)
+    candidate_seconds = time.perf_counter() - started
+
+    diff = np.abs(expected - actual)
+    return {
+        "samples": len(texts),
+        "label_agreement": float(np.mean(np.sign(expected) == np.sign(actual))) if texts else 1.0,
+        "max_abs_diff": float(diff.max()) if texts else 0.0,
+        "mean_abs_diff": float(diff.mean()) if texts else 0.0,
+        "reference_seconds": round(reference_seconds, 3),
+        "candidate_seconds": round(candidate_seconds, 3)
+    }
+
+
+if __name__ == "__main__":
+    # Export the ONNX model (if needed) and check it against PyTorch:
+    #   python sentiment_onnx.py [texts.txt] [min_label_agreement]
+    # texts.txt has one text per line; defaults to the SOP step texts plus a few call phrases.
+    import config
+    from nlp_processor import NLPProcessor
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r", encoding="utf-8") as f:
+            sample_texts = [line.strip() for line in f if line.strip()]
+    else:
+        sample_texts = [
+            step["text"]
+            for section in config.SOP_RULES["sop_rules"].values()
+            for step in section.get("steps", [])
+        ] + [
+            "My battery is not charging and I have been waiting for two hours.",
+            "Thank you so much, that fixed it!",
+            "This is the third time I am calling, nobody helps.",
+            "Okay, I will visit the station tomorrow."
+        ]
+    min_agreement = float(sys.argv[2]) if len(sys.argv) > 2 else 0.98
+
+    report = parity_report(NLPProcessor(backend="torch"), NLPProcessor(backend="onnx"), sample_texts)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    if report["label_agreement"] < min_agreement:
+        print(f"FAILED: label agreement below {min_agreement}")
+        sys.exit(1)
@@ -3,17 +3,19 @@ import os
 import json
 from llm_service import SOPConverter
 import re
+from keyword_matcher import KeywordMatcher
 
 class SOPEngine:
     def __init__(self):
         self.rules = config.SOP_RULES["sop_rules"]
-        self.risks = config.SOP_RULES["sentiments"]["risk_keywords"]
+        self.load_risk_keywords(config.SOP_RULES["sentiments"]["risk_keywords"])
         self.llm_service = SOPConverter()
         print("SOP Engine initialized (LLM-as-a-Judge Mode)")
         
-    def check_adherence(self, transcription, segmented_transcript, rules=None, sop_id=None):
+    def check_adherence(self, transcription, segmented_transcript, rules=None, sop_id=None, semantic_matcher=None):
         """
         Orchestrates the LLM evaluation of the call against SOP rules.
+        With a semantic_matcher, steps it decides confidently from embeddings skip the LLM.
         """
         results = {}
         
@@ -38,9 +40,21 @@ class SOPEngine:
         # 1. Prepare Transcript Text for LLM (including speaker labels)
         transcript_text = "\n".join([f"[{seg['speaker']}][{seg['start']:.1f}s] {seg['text']}" for seg in transcription])
         
-        # 2. Call LLM Service
-        # We pass the full rules because we want the LLM to verify all sections
-        evaluation_data = self.llm_service.evaluate_call(transcript_text, current_rules, policy_text=policy_text)
+        # 2. Local pre-screen, then the LLM for the steps it left open
+        evaluation_data = {}
+        step_ids = None
+        if semantic_matcher:
+            evaluation_data = semantic_matcher.prescreen(transcription, current_rules, allow_pass=not policy_text)
+            step_ids = [
+                f"{section}::{idx}"
+                for section, details in current_rules.items()
+                for idx in range(len(details.get("steps", [])))
+                if f"{section}::{idx}" not in evaluation_data
+            ]
+            print(f"Semantic pre-screen decided {len(evaluation_data)} step(s), {len(step_ids)} left for the LLM")
+        llm_results = self.llm_service.evaluate_call(transcript_text, current_rules, policy_text=policy_text, step_ids=step_ids)
+        for step_id, result in llm_results.items():
+            evaluation_data.setdefault(step_id, result)
         
         # 3. Format Results for Frontend
         # The LLM returns a dict like: {"Greeting::0": {"status": "PASS", ...}}
@@ -83,8 +97,8 @@ class SOPEngine:
                     "step": step_config["text"], 
                     "status": status, 
                     "confidence": confidence,
-                    "matched_text": None, # LLM doesn't always return exact distinct segment
-                    "timestamp": None,
+                    "matched_text": eval_result.get("matched_text"), # LLM doesn't always return exact distinct segment
+                    "timestamp": eval_result.get("timestamp"),
                     "reason": reason,
                     "suggestion": step_config.get("suggestion") if status != "PASS" else None
                 })
@@ -109,28 +123,45 @@ class SOPEngine:
         
         return results
 
-    def detect_risks(self, transcription):
-        """Detect risk keywords (Lite version without embeddings for now)"""
-        found_risks = []
-        detected_risks = set()
-        
-        if not transcription:
-            return found_risks
-        
-        # Keyword-based detection
-        full_text = " ".join([seg["text"] for seg in transcription]).lower()
-        for risk in self.risks:
-            if risk.lower() in full_text:
-                risk_key = f"keyword_{risk.lower()}"
-                if risk_key not in detected_risks:
-                    found_risks.append({
-                        "type": "keyword",
-                        "risk": risk,
-                        "detection_method": "exact_match"
-                    })
-                    detected_risks.add(risk_key)
-        
-        return found_risks
+    def load_risk_keywords(self, risks):
+        """Compiles the risk keywords into one whole-word matcher."""
+        self.risks = list(risks)
+        self.risk_matcher = KeywordMatcher((risk, risk) for risk in self.risks)
+
+    def find_risk_hits(self, transcription, first_index=0):
+        """Every risk keyword occurrence, in transcript order, with its segment index, speaker and time."""
+        hits = []
+        for i, seg in enumerate(transcription, start=first_index):
+            for _, _, risk in self.risk_matcher.find_all(seg["text"]):
+                hits.append({
+                    "risk": risk,
+                    "segment_index": i,
+                    "speaker": seg.get("speaker"),
+                    "timestamp": seg.get("start")
+                })
+        return hits
+
+    def detect_risks(self, transcription, first_index=0):
+        """
+        Detect risk keywords (whole words, one scan per segment; no embeddings for now).
+        One entry per keyword found, located at its first occurrence, with all occurrences listed.
+        """
+        found_risks = {}
+        for hit in self.find_risk_hits(transcription, first_index):
+            if hit["risk"] not in found_risks:
+                found_risks[hit["risk"]] = {
+                    "type": "keyword",
+                    "risk": hit["risk"],
+                    "detection_method": "exact_match",
+                    "segment_index": hit["segment_index"],
+                    "speaker": hit["speaker"],
+                    "timestamp": hit["timestamp"],
+                    "occurrences": []
+                }
+            found_risks[hit["risk"]]["occurrences"].append(
+                {key: hit[key] for key in ("segment_index", "speaker", "timestamp")}
+            )
+        return list(found_risks.values())
 
     def validate_resolution(self, segmented_transcript, sop_results=None):
         """Validate that resolution steps are present and meaningful"""
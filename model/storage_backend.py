@@ -0,0 +1,731 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, Callable
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+from call_metrics import (
+    ALL_REGIONS, ROLLUP_GRANULARITIES, summarize_call, call_regions, classify_coaching,
+    time_bucket, rollup_dimensions,
+)
+from file_store import atomic_write
+
+# Position in the coaching queue: (date, seq) of the last entry returned
+CoachingCursor = Tuple[str, int]
+
+
+class StorageBackend:
+    """
+    Interface for call record storage used by DBService.
+    Implementations must be safe to call from FastAPI's worker threads.
+    """
+
+    def insert_calls(self, calls: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def load_all(self) -> List[Dict]:
+        raise NotImplementedError
+
+    def find_calls(self, region: Optional[str] = None, user_id: Optional[str] = None) -> List[Dict]:
+        raise NotImplementedError
+
+    def find_call(self, call_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def version(self):
+        """Cheap token that changes whenever stored data changes, from this or any other process."""
+        raise NotImplementedError
+
+    def region_stats(self, region: Optional[str] = None, top_n: int = 5) -> Dict[str, Any]:
+        """
+        Running aggregates for a region (or all regions): total_calls, score_sum,
+        pass_count and the top_n most failed steps as (step, count) pairs.
+        """
+        raise NotImplementedError
+
+    def recent_calls(self, region: Optional[str] = None, limit: int = 5) -> List[Dict]:
+        """The last `limit` calls in insertion order, optionally for a region."""
+        raise NotImplementedError
+
+    def page_seqs(self, region: Optional[str] = None, user_id: Optional[str] = None,
+                  after: Optional[int] = None, limit: Optional[int] = None) -> List[int]:
+        """Sequence numbers of the matching calls after `after`, in insertion order."""
+        raise NotImplementedError
+
+    def iter_calls(self, region: Optional[str] = None, user_id: Optional[str] = None,
+                   after: Optional[int] = None, limit: Optional[int] = None) -> Iterator[Tuple[int, Dict]]:
+        """Lazily yield (seq, record) for the matching calls after `after`, in insertion order."""
+        raise NotImplementedError
+
+    def coaching_page(self, tag: Optional[str] = None, region: Optional[str] = None,
+                      after: Optional[CoachingCursor] = None,
+                      limit: Optional[int] = None) -> List[Tuple[CoachingCursor, Dict]]:
+        """
+        Coaching-needs entries, newest first, as (cursor, entry) pairs.
+        Pass the last cursor as `after` to continue from there.
+        """
+        raise NotImplementedError
+
+    def rollup_series(self, granularity: str, dimension: str, key: str,
+                      start: Optional[str] = None, end: Optional[str] = None,
+                      top_n: int = 3) -> List[Dict[str, Any]]:
+        """
+        Time-bucketed totals for one region ("region", key) or agent ("agent", user_id),
+        for bucket keys between start and end inclusive, in time order. Each bucket has
+        total_calls, score_sum, pass_count and its top_n failed steps as (step, count) pairs.
+        """
+        raise NotImplementedError
+
+
+class JSONBackend(StorageBackend):
+    """
+    Legacy single-file backend: the whole history lives in one JSON array.
+    Every insert rewrites the file, so it is only suitable for small datasets.
+    Writers serialize on a lock file and replace the file atomically, so concurrent
+    writers cannot drop each other's records and readers never see a partial file.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._write_lock = threading.Lock()
+        self.ensure_db_exists()
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive write lock across threads and (where fcntl exists) processes."""
+        with self._write_lock, open(self.db_path + ".lock", "w") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def ensure_db_exists(self):
+        """Ensure the JSON database file and its directory exist."""
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        if not os.path.exists(self.db_path):
+            with open(self.db_path, "w") as f:
+                json.dump([], f)
+
+    def load_all(self) -> List[Dict]:
+        try:
+            with open(self.db_path, "r") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return []
+
+    def insert_calls(self, calls: List[Dict[str, Any]]):
+        with self._locked():
+            existing = self.load_all()
+            existing.extend(calls)
+            with atomic_write(self.db_path, fsync=True) as f:
+                json.dump(existing, f, indent=2)
+
+    def find_calls(self, region: Optional[str] = None, user_id: Optional[str] = None) -> List[Dict]:
+        calls = self.load_all()
+        if region:
+            calls = [c for c in calls if (c.get("metadata") or {}).get("region") == region]
+        if user_id:
+            calls = [c for c in calls if c.get("user_id") == user_id]
+        return calls
+
+    def find_call(self, call_id: str) -> Optional[Dict]:
+        for call in self.load_all():
+            if call.get("call_id") == call_id:
+                return call
+        return None
+
+    def count(self) -> int:
+        return len(self.load_all())
+
+    def version(self):
+        try:
+            st = os.stat(self.db_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def region_stats(self, region: Optional[str] = None, top_n: int = 5) -> Dict[str, Any]:
+        stats = {"total_calls": 0, "score_sum": 0, "pass_count": 0}
+        failed = Counter()
+        for call in self.find_calls(region):
+            summary = summarize_call(call)
+            stats["total_calls"] += 1
+            stats["score_sum"] += summary["score"]
+            stats["pass_count"] += int(summary["passed"])
+            failed.update(summary["failed_steps"])
+        stats["failed_steps"] = failed.most_common(top_n)
+        return stats
+
+    def recent_calls(self, region: Optional[str] = None, limit: int = 5) -> List[Dict]:
+        return self.find_calls(region)[-limit:]
+
+    def _matching(self, region, user_id, after):
+        # seq is the 1-based position in the file
+        for seq, call in enumerate(self.load_all(), start=1):
+            if after is not None and seq <= after:
+                continue
+            if region and (call.get("metadata") or {}).get("region") != region:
+                continue
+            if user_id and call.get("user_id") != user_id:
+                continue
+            yield seq, call
+
+    def page_seqs(self, region=None, user_id=None, after=None, limit=None) -> List[int]:
+        seqs = [seq for seq, _ in self._matching(region, user_id, after)]
+        return seqs[:limit] if limit is not None else seqs
+
+    def iter_calls(self, region=None, user_id=None, after=None, limit=None) -> Iterator[Tuple[int, Dict]]:
+        for n, item in enumerate(self._matching(region, user_id, after)):
+            if limit is not None and n >= limit:
+                return
+            yield item
+
+    def coaching_page(self, tag=None, region=None, after=None, limit=None) -> List[Tuple[CoachingCursor, Dict]]:
+        page = []
+        for seq, call in self._matching(region, None, None):
+            entry = classify_coaching(call)
+            if entry and (not tag or tag in entry["tags"]):
+                page.append(((entry["date"] or "", seq), entry))
+        # Newest first; the stable sort keeps insertion order for equal dates
+        page.sort(key=lambda item: item[0][0], reverse=True)
+        if after is not None:
+            date, seq = after
+            page = [item for item in page if item[0][0] < date or (item[0][0] == date and item[0][1] > seq)]
+        return page[:limit] if limit is not None else page
+
+    def rollup_series(self, granularity, dimension, key, start=None, end=None, top_n=3) -> List[Dict[str, Any]]:
+        buckets: Dict[str, Dict[str, Any]] = {}
+        for call in self.load_all():
+            bucket = time_bucket(call.get("timestamp"), granularity)
+            if bucket is None or (start and bucket < start) or (end and bucket > end):
+                continue
+            if (dimension, key) not in rollup_dimensions(call):
+                continue
+            summary = summarize_call(call)
+            stats = buckets.setdefault(
+                bucket, {"bucket": bucket, "total_calls": 0, "score_sum": 0, "pass_count": 0, "failed": Counter()}
+            )
+            stats["total_calls"] += 1
+            stats["score_sum"] += summary["score"]
+            stats["pass_count"] += int(summary["passed"])
+            stats["failed"].update(summary["failed_steps"])
+        series = []
+        for bucket in sorted(buckets):
+            stats = buckets[bucket]
+            stats["failed_steps"] = stats.pop("failed").most_common(top_n)
+            series.append(stats)
+        return series
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Embedded SQLite backend running in WAL mode.
+    Each call is a single row, so an insert costs the same regardless of history size.
+    The full record is kept as a JSON blob; frequently filtered fields are lifted into columns.
+    Writes take SQLite's write lock up front (BEGIN IMMEDIATE), so several uvicorn workers
+    can share one database; readers see the last committed snapshot while a write is in progress.
+    """
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS calls (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            call_id TEXT,
+            region TEXT,
+            user_id TEXT,
+            timestamp TEXT,
+            record TEXT NOT NULL
+        )
+        """,
+        # Secondary indexes for point lookups and filtered listings (seq keeps insertion order)
+        "CREATE INDEX IF NOT EXISTS idx_calls_call_id ON calls (call_id)",
+        "CREATE INDEX IF NOT EXISTS idx_calls_region ON calls (region, seq)",
+        "CREATE INDEX IF NOT EXISTS idx_calls_user_id ON calls (user_id, seq)",
+        # Running per-region aggregates, maintained on insert (region '*' = all regions)
+        """
+        CREATE TABLE IF NOT EXISTS region_stats (
+            region TEXT PRIMARY KEY,
+            total_calls INTEGER NOT NULL DEFAULT 0,
+            score_sum REAL NOT NULL DEFAULT 0,
+            pass_count INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS region_failed_steps (
+            region TEXT NOT NULL,
+            step TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (region, step)
+        )
+        """,
+        # Precomputed coaching queue: one row per call that needs review, ordered by date
+        """
+        CREATE TABLE IF NOT EXISTS coaching_needs (
+            seq INTEGER PRIMARY KEY,
+            date TEXT NOT NULL,
+            region TEXT,
+            tag TEXT,
+            entry TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_coaching_date ON coaching_needs (date DESC, seq)",
+        "CREATE INDEX IF NOT EXISTS idx_coaching_tag ON coaching_needs (tag, date DESC, seq)",
+        "CREATE INDEX IF NOT EXISTS idx_coaching_region ON coaching_needs (region, date DESC, seq)",
+        # Hourly and daily rollups per region ('*' = all regions) and per agent (user_id)
+        """
+        CREATE TABLE IF NOT EXISTS rollups (
+            granularity TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            total_calls INTEGER NOT NULL DEFAULT 0,
+            score_sum REAL NOT NULL DEFAULT 0,
+            pass_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, dimension, key, bucket)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS rollup_failed_steps (
+            granularity TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            step TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, dimension, key, bucket, step)
+        )
+        """,
+        # Markers for derived tables that have been backfilled from existing calls
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    ]
+
+    # Derived tables maintained on insert, as (meta key, update function name)
+    DERIVED = [
+        ("backfilled:coaching_needs", "_update_coaching"),
+        ("backfilled:rollups", "_update_rollups"),
+    ]
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._version_conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
+        self._version_lock = threading.Lock()
+        with self._transaction() as conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+        self._backfill_aggregates()
+        self._backfill_derived()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers proceed while a writer commits."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Every commit is fsynced; GroupCommitWriter amortizes that over bursts of saves
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction holding the database write lock from the start."""
+        conn = self._conn()
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    @staticmethod
+    def _row_values(call: Dict[str, Any]):
+        metadata = call.get("metadata") or {}
+        return (
+            call.get("call_id"),
+            metadata.get("region"),
+            call.get("user_id"),
+            call.get("timestamp"),
+            json.dumps(call),
+        )
+
+    def insert_calls(self, calls: List[Dict[str, Any]]):
+        with self._transaction() as conn:
+            self._insert(conn, calls)
+
+    def insert_calls_if_empty(self, calls: List[Dict[str, Any]]) -> bool:
+        """Insert calls only if the table holds none, checked in the same write transaction."""
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM calls LIMIT 1").fetchone():
+                return False
+            self._insert(conn, calls)
+            return True
+
+    def _insert(self, conn: sqlite3.Connection, calls: List[Dict[str, Any]]):
+        for call in calls:
+            seq = conn.execute(
+                "INSERT INTO calls (call_id, region, user_id, timestamp, record) VALUES (?, ?, ?, ?, ?)",
+                self._row_values(call),
+            ).lastrowid
+            self._update_aggregates(conn, call)
+            for _, update in self.DERIVED:
+                getattr(self, update)(conn, seq, call)
+
+    @staticmethod
+    def _update_aggregates(conn: sqlite3.Connection, call: Dict[str, Any]):
+        """Fold one call into the running aggregates. Runs inside the insert transaction."""
+        summary = summarize_call(call)
+        for region in call_regions(call):
+            conn.execute(
+                """
+                INSERT INTO region_stats (region, total_calls, score_sum, pass_count) VALUES (?, 1, ?, ?)
+                ON CONFLICT(region) DO UPDATE SET
+                    total_calls = total_calls + 1,
+                    score_sum = score_sum + excluded.score_sum,
+                    pass_count = pass_count + excluded.pass_count
+                """,
+                (region, summary["score"], int(summary["passed"])),
+            )
+            for step in summary["failed_steps"]:
+                conn.execute(
+                    """
+                    INSERT INTO region_failed_steps (region, step, count) VALUES (?, ?, 1)
+                    ON CONFLICT(region, step) DO UPDATE SET count = count + 1
+                    """,
+                    (region, step),
+                )
+
+    def _backfill_aggregates(self):
+        """Build the aggregates for databases created before they were maintained on insert."""
+        conn = self._conn()
+        has_stats = conn.execute("SELECT 1 FROM region_stats LIMIT 1").fetchone()
+        if has_stats or self.count() == 0:
+            return
+        print("Backfilling call aggregates...")
+        with self._transaction() as conn:
+            for (record,) in conn.execute("SELECT record FROM calls ORDER BY seq").fetchall():
+                self._update_aggregates(conn, json.loads(record))
+
+    @staticmethod
+    def _update_coaching(conn: sqlite3.Connection, seq: int, call: Dict[str, Any]):
+        """Classify the call once and, if it needs review, enqueue it in the coaching queue."""
+        entry = classify_coaching(call)
+        if not entry:
+            return
+        conn.execute(
+            "INSERT OR REPLACE INTO coaching_needs (seq, date, region, tag, entry) VALUES (?, ?, ?, ?, ?)",
+            (seq, entry["date"] or "", (call.get("metadata") or {}).get("region"),
+             entry["tags"][0] if entry["tags"] else None, json.dumps(entry)),
+        )
+
+    @staticmethod
+    def _update_rollups(conn: sqlite3.Connection, seq: int, call: Dict[str, Any]):
+        """Add the call to its hour and day buckets for every region/agent it belongs to."""
+        summary = summarize_call(call)
+        for granularity in ROLLUP_GRANULARITIES:
+            bucket = time_bucket(call.get("timestamp"), granularity)
+            if bucket is None:
+                continue
+            for dimension, key in rollup_dimensions(call):
+                conn.execute(
+                    """
+                    INSERT INTO rollups (granularity, dimension, key, bucket, total_calls, score_sum, pass_count)
+                    VALUES (?, ?, ?, ?, 1, ?, ?)
+                    ON CONFLICT(granularity, dimension, key, bucket) DO UPDATE SET
+                        total_calls = total_calls + 1,
+                        score_sum = score_sum + excluded.score_sum,
+                        pass_count = pass_count + excluded.pass_count
+                    """,
+                    (granularity, dimension, key, bucket, summary["score"], int(summary["passed"])),
+                )
+                for step in summary["failed_steps"]:
+                    conn.execute(
+                        """
+                        INSERT INTO rollup_failed_steps (granularity, dimension, key, bucket, step, count)
+                        VALUES (?, ?, ?, ?, ?, 1)
+                        ON CONFLICT(granularity, dimension, key, bucket, step) DO UPDATE SET count = count + 1
+                        """,
+                        (granularity, dimension, key, bucket, step),
+                    )
+
+    def _backfill_derived(self):
+        """Populate derived tables that were added after the calls they summarize were stored."""
+        conn = self._conn()
+        for key, update in self.DERIVED:
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                continue
+            with self._transaction() as conn:
+                if self.count():
+                    print(f"Backfilling {key.split(':', 1)[1]}...")
+                    for seq, record in conn.execute("SELECT seq, record FROM calls ORDER BY seq").fetchall():
+                        getattr(self, update)(conn, seq, json.loads(record))
+                conn.execute("INSERT INTO meta (key, value) VALUES (?, '1')", (key,))
+
+    def _records(self, rows: Iterable) -> List[Dict]:
+        return [json.loads(row[0]) for row in rows]
+
+    def load_all(self) -> List[Dict]:
+        return self._records(self._conn().execute("SELECT record FROM calls ORDER BY seq"))
+
+    def find_calls(self, region: Optional[str] = None, user_id: Optional[str] = None) -> List[Dict]:
+        where, params = self._filter_clause(region, user_id, None)
+        return self._records(self._conn().execute(f"SELECT record FROM calls{where} ORDER BY seq", params))
+
+    def find_call(self, call_id: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT record FROM calls WHERE call_id = ? LIMIT 1", (call_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM calls").fetchone()[0]
+
+    def version(self):
+        # data_version changes whenever another connection commits. This connection never
+        # writes, so it sees every commit; reading it only touches the WAL index, not the data.
+        with self._version_lock:
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def region_stats(self, region: Optional[str] = None, top_n: int = 5) -> Dict[str, Any]:
+        conn = self._conn()
+        key = region or ALL_REGIONS
+        row = conn.execute(
+            "SELECT total_calls, score_sum, pass_count FROM region_stats WHERE region = ?", (key,)
+        ).fetchone()
+        total_calls, score_sum, pass_count = row or (0, 0, 0)
+        failed_steps = conn.execute(
+            "SELECT step, count FROM region_failed_steps WHERE region = ? ORDER BY count DESC, rowid LIMIT ?",
+            (key, top_n),
+        ).fetchall()
+        return {
+            "total_calls": total_calls,
+            "score_sum": score_sum,
+            "pass_count": pass_count,
+            "failed_steps": [tuple(r) for r in failed_steps],
+        }
+
+    def recent_calls(self, region: Optional[str] = None, limit: int = 5) -> List[Dict]:
+        if region:
+            rows = self._conn().execute(
+                "SELECT record FROM calls WHERE region = ? ORDER BY seq DESC LIMIT ?", (region, limit)
+            )
+        else:
+            rows = self._conn().execute("SELECT record FROM calls ORDER BY seq DESC LIMIT ?", (limit,))
+        return list(reversed(self._records(rows)))
+
+    @staticmethod
+    def _filter_clause(region, user_id, after):
+        clauses, params = [], []
+        if region:
+            clauses.append("region = ?")
+            params.append(region)
+        if user_id:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        if after is not None:
+            clauses.append("seq > ?")
+            params.append(after)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def page_seqs(self, region=None, user_id=None, after=None, limit=None) -> List[int]:
+        where, params = self._filter_clause(region, user_id, after)
+        query = f"SELECT seq FROM calls{where} ORDER BY seq"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [row[0] for row in self._conn().execute(query, params)]
+
+    def iter_calls(self, region=None, user_id=None, after=None, limit=None,
+                   batch_size: int = 200) -> Iterator[Tuple[int, Dict]]:
+        """
+        Keyset-paginated scan: each batch is a separate short query, so memory stays
+        bounded and the generator can be resumed from any worker thread.
+        """
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            where, params = self._filter_clause(region, user_id, after)
+            rows = self._conn().execute(
+                f"SELECT seq, record FROM calls{where} ORDER BY seq LIMIT ?", params + [size]
+            ).fetchall()
+            for seq, record in rows:
+                yield seq, json.loads(record)
+            if len(rows) < size:
+                return
+            after = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+
+    def coaching_page(self, tag=None, region=None, after=None, limit=None) -> List[Tuple[CoachingCursor, Dict]]:
+        clauses, params = [], []
+        if tag:
+            clauses.append("tag = ?")
+            params.append(tag)
+        if region:
+            clauses.append("region = ?")
+            params.append(region)
+        if after is not None:
+            # Keyset continuation in (date DESC, seq ASC) order
+            clauses.append("(date < ? OR (date = ? AND seq > ?))")
+            params.extend([after[0], after[0], after[1]])
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        query = f"SELECT date, seq, entry FROM coaching_needs{where} ORDER BY date DESC, seq"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [((date, seq), json.loads(entry)) for date, seq, entry in self._conn().execute(query, params)]
+
+    def rollup_series(self, granularity, dimension, key, start=None, end=None, top_n=3) -> List[Dict[str, Any]]:
+        conn = self._conn()
+        where = "granularity = ? AND dimension = ? AND key = ? AND bucket >= ? AND bucket <= ?"
+        # "~" sorts after every digit, so a missing end bound covers all buckets
+        params = [granularity, dimension, key, start or "", end or "~"]
+        series = [
+            {"bucket": bucket, "total_calls": total, "score_sum": score_sum, "pass_count": passed, "failed_steps": []}
+            for bucket, total, score_sum, passed in conn.execute(
+                f"SELECT bucket, total_calls, score_sum, pass_count FROM rollups WHERE {where} ORDER BY bucket",
+                params,
+            )
+        ]
+        by_bucket = {stats["bucket"]: stats for stats in series}
+        for bucket, step, count in conn.execute(
+            f"SELECT bucket, step, count FROM rollup_failed_steps WHERE {where} ORDER BY bucket, count DESC, rowid",
+            params,
+        ):
+            failed = by_bucket[bucket]["failed_steps"]
+            if len(failed) < top_n:
+                failed.append((step, count))
+        return series
+
+
+class _PendingWrite:
+    def __init__(self, call: Dict[str, Any]):
+        self.call = call
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class GroupCommitWriter:
+    """
+    Batches concurrent inserts into one transaction (and so one fsync).
+    submit() blocks until the caller's record is durably committed. The writer thread
+    waits at most `max_delay` seconds for more records before committing a batch.
+    """
+
+    def __init__(self, backend: StorageBackend, max_batch: int = 64, max_delay: float = 0.005):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: "queue.Queue[Optional[_PendingWrite]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, call: Dict[str, Any]):
+        """
+        Queue a record for the next batch and wait for it to be committed.
+        Blocks the calling thread: from async code, call it through a thread pool so that
+        concurrent saves can meet in the same batch.
+        """
+        pending = _PendingWrite(call)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error:
+            raise pending.error
+
+    def close(self):
+        """Commit anything still queued and stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_batch(self, first: _PendingWrite) -> List[_PendingWrite]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Shutdown requested: commit this batch, then exit
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _commit(self, batch: List[_PendingWrite]):
+        try:
+            self.backend.insert_calls([p.call for p in batch])
+        except Exception:
+            if len(batch) == 1:
+                raise
+            # Isolate the failing record so the rest of the batch still lands
+            for pending in batch:
+                try:
+                    self.backend.insert_calls([pending.call])
+                except Exception as e:
+                    pending.error = e
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._next_batch(first)
+            try:
+                self._commit(batch)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            for pending in batch:
+                pending.done.set()
+
+
+def create_backend(kind: str, db_path: str) -> StorageBackend:
+    """Instantiate a storage backend by name ("sqlite" or "json")."""
+    if kind == "sqlite":
+        return SQLiteBackend(db_path)
+    if kind == "json":
+        return JSONBackend(db_path)
+    raise ValueError(f"Unknown storage backend: {kind}")
+
+
+def migrate_json_to_sqlite(json_path: str, target: SQLiteBackend,
+                           transform: Optional[Callable[[Dict], Dict]] = None) -> int:
+    """
+    One-shot migration of a legacy calls.json file into a SQLite backend.
+    `transform` is applied to each record before insert (e.g. to move transcripts to the blob store).
+    Skipped if the target already holds calls; the check and the insert share one write
+    transaction, so concurrently starting workers migrate only once. Returns the number of migrated records.
+    """
+    # Cheap pre-check, so a populated database never reads the JSON file
+    if not os.path.exists(json_path) or target.count() > 0:
+        return 0
+
+    calls = JSONBackend(json_path).load_all()
+    if transform:
+        calls = [transform(c) for c in calls]
+    if not calls or not target.insert_calls_if_empty(calls):
+        return 0
+    print(f"Migrated {len(calls)} calls from {json_path} to {target.db_path}")
+    return len(calls)
+
@@ -0,0 +1,121 @@
+import numpy as np
+from typing import Optional, Tuple
+from audio_processor import DecodedAudio, SAMPLE_RATE
+from alignment import assign_speakers
+from stt_service import speech_chunks, CHUNK_LENGTH
+import config
+
+# Wire formats accepted for streamed audio (16 kHz mono)
+PCM_DTYPES = {
+    "pcm_s16le": np.dtype("<i2"),
+    "pcm_f32le": np.dtype("<f4"),
+}
+
+class StreamTranscriber:
+    """
+    Incremental transcription of a call whose audio arrives while it is still going on.
+    Audio is buffered as 16 kHz float32 PCM; once enough of it is pending, the part up to the
+    end of the last finished utterance (found by VAD) is transcribed as one window, so windows
+    are cut in pauses rather than mid-word. Segments keep times relative to the call start.
+    """
+
+    def __init__(self, stt_service, encoding: str = "pcm_s16le", min_window: Optional[float] = None,
+                 tail_silence: float = 0.5):
+        if encoding not in PCM_DTYPES:
+            raise ValueError(f"Unsupported audio encoding: {encoding}")
+        self.stt_service = stt_service
+        self.dtype = PCM_DTYPES[encoding]
+        self.min_window = config.STREAM_MIN_WINDOW if min_window is None else min_window
+        self.tail_silence = tail_silence
+        self.segments = []
+        self.info = None
+        self._buffer = bytearray()  # float32 samples
+        self._pending_bytes = b""  # partial sample at the end of the last frame
+        self._committed = 0  # samples already transcribed
+        self._checked = 0  # buffer length at the last window search
+
+    @property
+    def total_samples(self) -> int:
+        return len(self._buffer) // 4
+
+    @property
+    def transcribed_until(self) -> float:
+        return self._committed / SAMPLE_RATE
+
+    def add_audio(self, data: bytes):
+        # Frames need not end on a sample boundary; carry the partial sample over to the next one
+        data = self._pending_bytes + bytes(data)
+        whole = len(data) - len(data) % self.dtype.itemsize
+        self._pending_bytes = data[whole:]
+        samples = np.frombuffer(data[:whole], dtype=self.dtype)
+        if self.dtype.kind == "i":
+            samples = samples.astype(np.float32) / 32768.0
+        self._buffer += samples.astype(np.float32, copy=False).tobytes()
+
+    def _samples(self, start: int, end: int) -> np.ndarray:
+        # Copy, so no view pins the buffer while more audio is appended
+        return np.frombuffer(self._buffer, dtype=np.float32)[start:end].copy()
+
+    def next_window(self, final: bool = False) -> Optional[Tuple[int, int]]:
+        """
+        (start, end) sample range to transcribe next, or None to wait for more audio.
+        With final=True everything still pending is returned.
+        """
+        total = self.total_samples
+        pending = total - self._committed
+        if pending <= 0:
+            return None
+        if final:
+            return self._committed, total
+        # Search at most once per second of new audio
+        if pending < self.min_window * SAMPLE_RATE or total - self._checked < SAMPLE_RATE:
+            return None
+        self._checked = total
+
+        chunks = speech_chunks(self._samples(self._committed, total))
+        if not chunks:
+            if pending >= CHUNK_LENGTH * SAMPLE_RATE:
+                # Nothing but silence so far; skip it
+                self._committed = total
+            return None
+
+        # Cut after the last utterance that is already followed by a pause
+        finished = [end for _, end in chunks if end <= pending - self.tail_silence * SAMPLE_RATE]
+        if finished:
+            return self._committed, self._committed + finished[-1]
+        if pending >= CHUNK_LENGTH * SAMPLE_RATE:
+            return self._committed, total
+        return None
+
+    def transcribe_window(self, window: Tuple[int, int]):
+        """
+        Starts Whisper on a window; returns a segment iterator that decodes lazily.
+        Consume it fully before asking for the next window.
+        """
+        start, end = window
+        self._committed = end
+        language = self.info.language if self.info else None
+        segments, info = self.stt_service.transcribe_stream(self._samples(start, end), offset=start / SAMPLE_RATE, language=language)
+        if self.info is None:
+            self.info = info
+
+        def collect():
+            for segment in segments:
+                self.segments.append(segment)
+                yield segment
+        return collect()
+
+    def diarize(self):
+        """Diarizes the complete call and assigns speakers to the streamed segments."""
+        audio = DecodedAudio(self._samples(0, self.total_samples), source="stream")
+        turns = self.stt_service.diarize(audio)
+        if turns:
+            assign_speakers(self.segments, turns)
+        return self.segments
+
+    def metadata(self):
+        return {
+            "language": self.info.language if self.info else None,
+            "language_probability": self.info.language_probability if self.info else None,
+            "duration": self.total_samples / SAMPLE_RATE
+        }
@@ -1,15 +1,111 @@
 import torch
 import torchaudio
-from faster_whisper import WhisperModel
+import copy
+import numpy as np
+import queue
+import threading
+import time
+from bisect import bisect_right
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from collections import defaultdict
+from typing import List, Optional, Union
+from faster_whisper import WhisperModel, BatchedInferencePipeline, decode_audio
+from faster_whisper.transcribe import TranscriptionInfo
+from faster_whisper.vad import VadOptions, get_speech_timestamps
 from pyannote.audio import Pipeline
+from audio_processor import AudioProcessor, DecodedAudio, SAMPLE_RATE
+from alignment import assign_speakers
+from transcript_cache import TranscriptCache, audio_hash
+import chunk_worker
 import config
 import os
 
+# Whisper sees at most 30 seconds of audio per window
+CHUNK_LENGTH = 30
+
+def speech_chunks(audio: np.ndarray):
+    """
+    VAD speech regions of a 16 kHz waveform, merged greedily into windows of at most
+    CHUNK_LENGTH seconds. Returns (start, end) sample indices.
+    """
+    speech = get_speech_timestamps(audio, VadOptions(max_speech_duration_s=CHUNK_LENGTH, min_silence_duration_ms=160))
+    chunks = []
+    max_samples = CHUNK_LENGTH * SAMPLE_RATE
+    for region in speech:
+        if chunks and region["end"] - chunks[-1][0] <= max_samples:
+            chunks[-1][1] = region["end"]
+        else:
+            chunks.append([region["start"], region["end"]])
+    return [tuple(c) for c in chunks]
+
+class _PendingTranscription:
+    def __init__(self, audio):
+        self.audio = audio
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+class TranscriptionBatcher:
+    """
+    Collects audio files submitted from concurrent requests and transcribes them together.
+    The worker waits at most `max_delay` seconds for up to `max_files` files per batch.
+    """
+
+    def __init__(self, transcribe_batch, max_files: int = 4, max_delay: float = 0.2):
+        self.transcribe_batch = transcribe_batch
+        self.max_files = max_files
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="transcription-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, audio):
+        """Queue one audio file (path or 16 kHz array) and wait for its (segments, info)."""
+        pending = _PendingTranscription(audio)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error:
+            raise pending.error
+        return pending.result
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_files:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                results = self.transcribe_batch([p.audio for p in batch])
+                for pending, result in zip(batch, results):
+                    pending.result = result
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            for pending in batch:
+                pending.done.set()
+
 class STTService:
     def __init__(self):
         print(f"Loading Whisper model ({config.WHISPER_MODEL_SIZE})...")
         self.model = WhisperModel(config.WHISPER_MODEL_SIZE, device=config.DEVICE, compute_type="float32")
         
+        # Batched inference: VAD chunks of all queued files go through the model together
+        self.batcher = None
+        if config.WHISPER_BATCH_SIZE > 1:
+            self.batched_model = BatchedInferencePipeline(model=self.model)
+            self.batcher = TranscriptionBatcher(
+                self.transcribe_batch,
+                max_files=config.WHISPER_BATCH_FILES,
+                max_delay=config.WHISPER_BATCH_WAIT
+            )
+        
         self.diarization_pipeline = None
         if config.HF_TOKEN:
             try:
@@ -24,14 +120,47 @@ class STTService:
                 print(f"Error loading diarization pipeline: {e}")
         else:
             print("HF_TOKEN not found. Diarization will be skipped.")
+        
+        # Diarization runs beside transcription; both spend their time in native code outside the GIL
+        self.diarization_executor = ThreadPoolExecutor(max_workers=config.DIARIZATION_WORKERS, thread_name_prefix="diarize")
+        
+        # Worker processes for long calls, each with its own model; started on first use
+        self.audio_processor = AudioProcessor()
+        self._long_call_pool = None
+        self._long_call_pool_lock = threading.Lock()
+        
+        # Results of earlier runs on identical audio and model settings
+        self.transcript_cache = TranscriptCache(config.TRANSCRIPT_CACHE_DIR) if config.TRANSCRIPT_CACHE_DIR else None
+        # Cache key -> Future of its entry, for recordings being processed right now
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+
+    def warm_up(self):
+        """Runs the models once on a short silent clip so the first real call doesn't pay for lazy init."""
+        silence = np.zeros(2 * SAMPLE_RATE, dtype=np.float32)
+        segments, _ = self.model.transcribe(silence, language="en", task="translate", beam_size=5)
+        list(segments)
+        if self.diarization_pipeline:
+            try:
+                self.diarize(DecodedAudio(silence, source="warm-up"))
+            except Exception as e:
+                print(f"Diarization warm-up failed: {e}")
 
-    def transcribe(self, audio_path: str):
+    def transcribe(self, audio: Union[str, DecodedAudio]):
         """
         Transcribes audio and translates to English if task="translate" is used.
         In this case, we use task="translate" to handle Hindi/Hinglish to English.
+        With batching enabled, the file is queued and transcribed together with concurrent requests.
+        Accepts a path or an already decoded call (which skips Whisper's own decoding).
         """
-        print(f"Transcribing {audio_path}...")
-        segments, info = self.model.transcribe(audio_path, task="translate", beam_size=5)
+        source = audio.source if isinstance(audio, DecodedAudio) else audio
+        model_input = audio.samples if isinstance(audio, DecodedAudio) else audio
+        if self.batcher:
+            print(f"Queueing {source} for batched transcription...")
+            return self.batcher.submit(model_input)
+
+        print(f"Transcribing {source}...")
+        segments, info = self.model.transcribe(model_input, task="translate", beam_size=5)
         
         results = []
         for segment in segments:
@@ -44,17 +173,156 @@ class STTService:
         
         return results, info
 
-    def diarize(self, audio_path: str):
+    def transcribe_stream(self, audio: np.ndarray, offset: float = 0.0, language: Optional[str] = None):
+        """
+        Sequential transcription of one window of a live call, bypassing the batcher.
+        Returns (segments, info) like faster-whisper: segments is a lazy iterator, so each one
+        is available as soon as Whisper decodes it. Times are shifted by `offset` seconds.
+        """
+        segments, info = self.model.transcribe(audio, task="translate", beam_size=5, language=language)
+
+        def shifted():
+            for segment in segments:
+                yield {
+                    "start": segment.start + offset,
+                    "end": segment.end + offset,
+                    "text": segment.text.strip(),
+                    "speaker": "Unknown"
+                }
+        return shifted(), info
+
+    def transcribe_batch(self, audios: List[Union[str, np.ndarray]]):
+        """
+        Transcribes several files in shared batched forward passes.
+        Returns one (segments, info) pair per input, in input order.
+        """
+        decoded = [a if isinstance(a, np.ndarray) else decode_audio(a, sampling_rate=SAMPLE_RATE) for a in audios]
+        print(f"Batch transcribing {len(decoded)} file(s)...")
+
+        # Translation decodes from a single source language per call, so group files by language
+        groups = defaultdict(list)
+        detected = []
+        for idx, audio in enumerate(decoded):
+            language, probability, _ = self.model.detect_language(audio=audio)
+            detected.append((language, probability))
+            groups[language].append(idx)
+
+        outputs = [None] * len(decoded)
+        for language, indices in groups.items():
+            group_segments, speech_durations = self._transcribe_group(language, [decoded[i] for i in indices])
+            for i, segments, speech_duration in zip(indices, group_segments, speech_durations):
+                info = TranscriptionInfo(
+                    language=language,
+                    language_probability=detected[i][1],
+                    duration=len(decoded[i]) / SAMPLE_RATE,
+                    duration_after_vad=speech_duration,
+                    all_language_probs=None,
+                    transcription_options=None,
+                    vad_options=None
+                )
+                outputs[i] = (segments, info)
+        return outputs
+
+    def _transcribe_group(self, language: str, audios: List[np.ndarray]):
+        """
+        Concatenates the files, passes every file's speech windows as clip timestamps
+        (so no window spans two files), then maps the segments back to their file.
+        """
+        file_starts, clips, speech_durations = [], [], []
+        position = 0
+        for audio in audios:
+            file_starts.append(position / SAMPLE_RATE)
+            chunks = speech_chunks(audio)
+            clips.extend({"start": (position + start) / SAMPLE_RATE, "end": (position + end) / SAMPLE_RATE} for start, end in chunks)
+            speech_durations.append(sum(end - start for start, end in chunks) / SAMPLE_RATE)
+            position += len(audio)
+
+        per_file = [[] for _ in audios]
+        if not clips:
+            return per_file, speech_durations
+
+        segments, _ = self.batched_model.transcribe(
+            np.concatenate(audios),
+            language=language,
+            task="translate",
+            beam_size=5,
+            clip_timestamps=clips,
+            batch_size=config.WHISPER_BATCH_SIZE,
+            without_timestamps=False
+        )
+        for segment in segments:
+            # Segment times are rounded to milliseconds; nudge so a segment at a file boundary maps forward
+            idx = bisect_right(file_starts, segment.start + 0.001) - 1
+            offset = file_starts[idx]
+            per_file[idx].append({
+                "start": max(0.0, segment.start - offset),
+                "end": segment.end - offset,
+                "text": segment.text.strip(),
+                "speaker": "Unknown"
+            })
+        return per_file, speech_durations
+
+    def _get_long_call_pool(self) -> ProcessPoolExecutor:
+        with self._long_call_pool_lock:
+            if self._long_call_pool is None:
+                workers = config.LONG_CALL_WORKERS
+                cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+                print(f"Starting {workers} long-call transcription workers ({cpu_threads} threads each)...")
+                # spawn: CUDA and CTranslate2 state must not be inherited through fork
+                self._long_call_pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=chunk_worker.init,
+                    initargs=(config.WHISPER_MODEL_SIZE, config.DEVICE, cpu_threads)
+                )
+            return self._long_call_pool
+
+    def transcribe_long(self, audio: DecodedAudio):
+        """
+        Transcribes a long call in parallel: the audio is cut into chunks of at most
+        LONG_CALL_CHUNK_SECONDS at silent gaps, the chunks are transcribed by the worker
+        processes, and the segments are put back together on the call's timeline.
+        The language is detected once here so every chunk is translated from the same one.
+        """
+        chunks = self.audio_processor.split_on_silence(audio.samples, SAMPLE_RATE, config.LONG_CALL_CHUNK_SECONDS)
+        if config.LONG_CALL_WORKERS <= 1 or len(chunks) <= 1:
+            return self.transcribe(audio)
+
+        language, probability, _ = self.model.detect_language(audio=np.asarray(audio.samples[:CHUNK_LENGTH * SAMPLE_RATE]))
+        print(f"Transcribing {audio.source} in {len(chunks)} chunks across {config.LONG_CALL_WORKERS} processes...")
+        pool = self._get_long_call_pool()
+        futures = [pool.submit(chunk_worker.transcribe, np.asarray(audio.samples[start:end]), start / SAMPLE_RATE, language)
+                   for start, end in chunks]
+
+        results = []
+        for future in futures:
+            results.extend(future.result())
+
+        info = TranscriptionInfo(
+            language=language,
+            language_probability=probability,
+            duration=audio.duration,
+            duration_after_vad=audio.duration,
+            all_language_probs=None,
+            transcription_options=None,
+            vad_options=None
+        )
+        return results, info
+
+    def diarize(self, audio: Union[str, DecodedAudio]):
         """
         Performs speaker diarization.
         """
         if not self.diarization_pipeline:
             return None
         
-        print(f"Diarizing {audio_path}...")
-        
-        # Load audio in-memory to avoid torchcodec dependency issues on Windows
-        waveform, sample_rate = torchaudio.load(audio_path)
+        if isinstance(audio, DecodedAudio):
+            print(f"Diarizing {audio.source}...")
+            waveform, sample_rate = audio.waveform_tensor(), audio.sample_rate
+        else:
+            print(f"Diarizing {audio}...")
+            # Load audio in-memory to avoid torchcodec dependency issues on Windows
+            waveform, sample_rate = torchaudio.load(audio)
         
         # Ensure waveform is on the correct device
         if config.DEVICE == "cuda":
@@ -76,20 +344,98 @@ class STTService:
             })
         return speakers
 
-    def process_call(self, audio_path: str):
+    def _cache_config(self, long_call: bool):
+        """Settings that change the STT output; part of the transcript cache key."""
+        if long_call and config.LONG_CALL_WORKERS > 1:
+            mode = f"chunked:{config.LONG_CALL_CHUNK_SECONDS}"
+        else:
+            mode = "batched" if self.batcher else "sequential"
+        return {
+            "whisper": config.WHISPER_MODEL_SIZE,
+            "compute_type": "float32",
+            "task": "translate",
+            "beam_size": 5,
+            "mode": mode,
+            "diarization": "pyannote/speaker-diarization-3.1" if self.diarization_pipeline else None
+        }
+
+    def process_call(self, audio: Union[str, DecodedAudio], long_call: bool = False):
         """
-        Combines transcription and diarization.
+        Combines transcription and diarization. Long calls are transcribed across the worker processes.
+        The audio is decoded once and the same buffer is given to both stages.
+        Diarization runs in a worker thread while this thread transcribes, so the call
+        takes about as long as the slower of the two stages.
+        Results are cached by audio content, so a repeated upload skips both stages. A copy that
+        arrives while the same recording is still being processed (and so would land in the same
+        transcription batch) waits for that result instead: one miss, one pass through the models.
         """
-        transcription, info = self.transcribe(audio_path)
-        diarization = self.diarize(audio_path)
-        
+        if not self.transcript_cache:
+            transcription, diarization, info = self._run_stages(audio, long_call)
+            if diarization:
+                assign_speakers(transcription, diarization)
+            return transcription, info
+
+        cache_key = TranscriptCache.key(audio_hash(audio), self._cache_config(long_call))
+        cached, owner = None, False
+        with self._in_flight_lock:
+            pending = self._in_flight.get(cache_key)
+            if pending is None:
+                cached = self.transcript_cache.get(cache_key)
+                if cached is None:
+                    pending = self._in_flight[cache_key] = Future()
+                    owner = True
+        if not owner:
+            if cached is None:
+                # The same recording is already being processed; share its result
+                cached = pending.result()
+                self.transcript_cache.hits += 1
+            print(f"Transcript cache hit for {audio.source if isinstance(audio, DecodedAudio) else audio}")
+            transcription = copy.deepcopy(cached["transcription"])
+            if cached["diarization"]:
+                assign_speakers(transcription, cached["diarization"])
+            info = TranscriptionInfo(**cached["info"], all_language_probs=None, transcription_options=None, vad_options=None)
+            return transcription, info
+
+        try:
+            transcription, diarization, info = self._run_stages(audio, long_call)
+            entry = {
+                "transcription": copy.deepcopy(transcription),
+                "diarization": diarization,
+                "info": {
+                    "language": info.language,
+                    "language_probability": info.language_probability,
+                    "duration": info.duration,
+                    "duration_after_vad": info.duration_after_vad
+                }
+            }
+            self.transcript_cache.put(cache_key, entry)
+            pending.set_result(entry)
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[cache_key]
+
         if diarization:
-            # Simple alignment logic: assign speaker based on start time overlap
-            for segment in transcription:
-                mid_point = (segment["start"] + segment["end"]) / 2
-                for speaker_turn in diarization:
-                    if speaker_turn["start"] <= mid_point <= speaker_turn["end"]:
-                        segment["speaker"] = speaker_turn["speaker"]
-                        break
-        
+            # Assign each segment the speaker it overlaps most (single sorted sweep)
+            assign_speakers(transcription, diarization)
         return transcription, info
+
+    def _run_stages(self, audio: Union[str, DecodedAudio], long_call: bool):
+        """(transcription, diarization or None, info) of a call, transcribing and diarizing side by side."""
+        owns_audio = not isinstance(audio, DecodedAudio)
+        if owns_audio:
+            audio = DecodedAudio.from_file(audio)
+
+        try:
+            diarization_future = None
+            if self.diarization_pipeline:
+                diarization_future = self.diarization_executor.submit(self.diarize, audio)
+
+            transcription, info = self.transcribe_long(audio) if long_call else self.transcribe(audio)
+            diarization = diarization_future.result() if diarization_future else None
+        finally:
+            if owns_audio:
+                audio.release()
+        return transcription, diarization, info
@@ -0,0 +1,39 @@
+import re
+from typing import List
+
+# Joins segment texts into one buffer; neither whitespace nor a word character, so it survives normalization
+_SEPARATOR = "\x00"
+
+
+class TextNormalizer:
+    """
+    Removes filler words and collapses whitespace. The patterns are compiled once; a whole
+    transcript is normalized with a single substitution over its joined segment texts.
+    """
+
+    def __init__(self, fillers: List[str]):
+        # Longest first, so multi-word fillers win over their prefixes; inner spaces match any whitespace
+        phrases = sorted({f.strip().lower() for f in fillers if f.strip()}, key=len, reverse=True)
+        filler = r"\b(?:" + "|".join(r"\s+".join(map(re.escape, p.split())) for p in phrases) + r")\b" if phrases else None
+        if filler:
+            # A run of whitespace and fillers becomes one space; fillers not touching whitespace are dropped
+            pattern = rf"(?P<space>(?:{filler})*\s(?:\s|{filler})*)|{filler}"
+        else:
+            pattern = r"(?P<space>\s+)"
+        self.pattern = re.compile(pattern, flags=re.IGNORECASE)
+
+    def _replace(self, match) -> str:
+        return " " if match.group("space") is not None else ""
+
+    def normalize(self, text: str) -> str:
+        return self.pattern.sub(self._replace, text).strip()
+
+    def normalize_all(self, texts: List[str]) -> List[str]:
+        """Normalizes many texts in one pass; same result as normalize() on each."""
+        if not texts:
+            return []
+        parts = self.pattern.sub(self._replace, _SEPARATOR.join(texts)).split(_SEPARATOR)
+        if len(parts) != len(texts):
+            # A text contained the separator itself
+            return [self.normalize(text) for text in texts]
+        return [part.strip() for part in parts]
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from typing import Any, Dict, Optional, Union
+from audio_processor import DecodedAudio
+from file_store import JSONFileStore
+import config
+
+# Seconds between two prune() runs triggered by put()
+PRUNE_INTERVAL = 24 * 3600
+
+
+def audio_hash(audio: Union[str, DecodedAudio]) -> str:
+    """SHA-256 of a recording: the file bytes for a path, the PCM samples for a decoded call."""
+    digest = hashlib.sha256()
+    if isinstance(audio, DecodedAudio):
+        digest.update(b"pcm16k-f32:")
+        digest.update(memoryview(np.ascontiguousarray(audio.samples, dtype=np.float32)).cast("B"))
+    else:
+        digest.update(b"file:")
+        with open(audio, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class TranscriptCache(JSONFileStore):
+    """
+    Persistent cache of speech-to-text results (transcript segments, diarization turns and
+    transcription info), keyed by the audio content hash and the model configuration, so a
+    re-uploaded recording skips Whisper and pyannote. Entries never change once written.
+    Entries not read or written for max_age_days are deleted by prune(), which runs when the
+    cache is opened and then at most once a day from put().
+    """
+
+    def __init__(self, root_dir: str, max_age_days: Optional[float] = None):
+        super().__init__(root_dir)
+        self.max_age_days = config.TRANSCRIPT_CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._last_pruned = 0.0
+        self.prune()
+
+    @staticmethod
+    def key(content_hash: str, model_config: Dict[str, Any]) -> str:
+        config_data = json.dumps(model_config, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(f"{content_hash}:{config_data}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached entry for a key, or None."""
+        entry = self.read(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            # A hit renews the entry, so recordings that keep coming back are not pruned
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return entry
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        self.write(key, json.dumps(entry).encode("utf-8"))
+        if time.time() - self._last_pruned > PRUNE_INTERVAL:
+            self.prune()
+
+    def prune(self) -> int:
+        """Delete entries (and leftover temp files) older than max_age_days; returns how many."""
+        self._last_pruned = time.time()
+        if not self.max_age_days:
+            return 0
+        cutoff = self._last_pruned - self.max_age_days * 86400
+        removed = 0
+        for path in self.paths():
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                # Removed concurrently by another worker
+                continue
+        if removed:
+            print(f"Pruned {removed} transcript cache entries older than {self.max_age_days} days")
+        return removed